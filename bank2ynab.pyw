@@ -1,14 +1,16 @@
 from pathlib import Path
+import threading
 from tkinter import Tk, StringVar, Toplevel, Message
-from tkinter.ttk import Combobox, Frame, Button, Label
+from tkinter.ttk import Combobox, Frame, Button, Label, Progressbar
 from tkinter.filedialog import askopenfilename
-from src.converter import bank2ynab
-from src.config import BankConfig
+from src.registry import bank_index, load_config
 
 PADX = 12
 PADY = 10
+POLL_MS = 100  # how often the progress of a conversion is shown
 
 BANK_DIR = Path("./banks")
+DETECT = "Detect from file"  # the choice to detect the bank from the header
 
 ###################################
 #           GUI-code
@@ -25,6 +27,16 @@ class Application(Tk):
         Tk.__init__(self)
         self._frame = None
         self.switch_frame(BankSelection)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def close(self):
+        """Closes the window, once a running conversion has been cancelled"""
+        if isinstance(self._frame, Conversion):
+            # Otherwise the worker is killed halfway, which leaves the
+            # temporary output file behind
+            self._frame.cancel()
+            self._frame.worker.join()
+        self.destroy()
 
     def switch_frame(self, frame_class, args=None):
         """Destroys current frame and replaces it with a new one."""
@@ -36,25 +48,25 @@ class Application(Tk):
         self._frame.grid(padx=PADX, pady=PADY)
         self._frame.master.title("Bank2YNAB4")
         self._frame.master.resizable(False, False)
+        return self._frame
 
 
 class BankSelection(Frame):
     def __init__(self, master=None, args=None):
         Frame.__init__(self, master)
-        banks = [BankConfig.from_file(b) for b in BANK_DIR.iterdir() if b.suffix == '.toml']
-        banks.sort(key=lambda b: b.name)
-        self.banks = banks
+        # Only the names are read here, the chosen config is loaded on Ok
+        self.banks = bank_index(BANK_DIR)
         self.createWidgets()
 
     def createWidgets(self):
         self.label = Label(self, text="Choose Your Bank:")
         self.label.grid(column=0, row=0, sticky="W", ipadx=2)
 
-        banknames = [b.name for b in self.banks]
+        banknames = [DETECT, *(b.name for b in self.banks)]
         self.bankName = StringVar()
         self.bankName.set(banknames[0])
 
-        self.bankChosen = Combobox(self, width=12, textvariable=self.bankName)
+        self.bankChosen = Combobox(self, width=16, textvariable=self.bankName)
         self.bankChosen["values"] = banknames
         self.bankChosen.grid(column=1, row=0)
 
@@ -64,15 +76,27 @@ class BankSelection(Frame):
     def convert(self):
         try:
             inputPath = self.getFile()
-            bank = self.banks[self.bankChosen.current()]
         except ValueError as e:
-            pass  # No file selected
+            return  # No file selected
+
+        chosen = self.bankChosen.current()
+        try:
+            if chosen <= 0:  # also if the name doesn't match any bank
+                bank, encoding = self.detectBank(inputPath)
+            else:
+                bank, encoding = load_config(self.banks[chosen - 1].path), "utf-8"
+        except (KeyError, OSError, ValueError, TypeError) as e:
+            Error(self, e)
         else:
-            try:
-                result = bank2ynab(bank, inputPath)
-                self.master.switch_frame(Report, result)
-            except (NameError, OSError, ValueError, TypeError) as e:
-                Error(self, e)
+            self.master.switch_frame(Conversion, (bank, inputPath, encoding))
+
+    def detectBank(self, inputPath: Path):
+        from src.detect import detect_bank
+
+        detection = detect_bank(inputPath, BANK_DIR)
+        if detection is None:
+            raise ValueError(f"No bank config matches the header of {inputPath.name}")
+        return detection.config, detection.encoding
 
     def getFile(self) -> Path:
         inputPath = askopenfilename(filetypes=[("CSV files", "*.csv")], initialdir=".")
@@ -82,6 +106,80 @@ class BankSelection(Frame):
             raise ValueError("No file selected")
 
 
+class Conversion(Frame):
+    """Converts a statement on a worker thread while showing its progress"""
+
+    def __init__(self, master, args):
+        from src.converter import Converter
+
+        Frame.__init__(self, master)
+        bank, self.inputPath, encoding = args
+        self.converter = Converter(config=bank, encoding=encoding)
+        self.result = None
+        self.error = None
+
+        self.createWidgets()
+
+        self.worker = threading.Thread(target=self.convert, daemon=True)
+        self.worker.start()
+        self.after(POLL_MS, self.poll)
+
+    def createWidgets(self):
+        self.label = Label(self, text=f"Converting {self.inputPath.name}...")
+        self.label.grid(column=0, row=0, columnspan=2, sticky="W")
+
+        self.progressBar = Progressbar(self, length=240, mode="determinate")
+        self.progressBar.grid(column=0, row=1, columnspan=2, pady=5)
+
+        self.statsLabel = Label(self, text="")
+        self.statsLabel.grid(column=0, row=2, sticky="W")
+
+        self.cancelButton = Button(self, text="Cancel", command=self.cancel)
+        self.cancelButton.grid(column=1, row=2, sticky="E")
+
+    def convert(self):
+        """Run the conversion (on the worker thread)"""
+        from src.converter import readIgnore
+
+        try:
+            toIgnore = readIgnore()
+        except OSError:
+            toIgnore = []  # It's okay to not have it.
+
+        try:
+            hasConverted = self.converter.convert(self.inputPath, toIgnore)
+            self.result = (hasConverted, *self.converter.counts())
+        except Exception as e:
+            self.error = e
+
+    def cancel(self):
+        self.cancelButton.state(["disabled"])
+        self.label["text"] = "Cancelling..."
+        self.converter.cancel()
+
+    def poll(self):
+        """Show the progress, or the outcome once the conversion is done"""
+        from src.converter import ConversionCancelled
+
+        if self.worker.is_alive():
+            progress = self.converter.progress()
+            if progress.bytes_total > 0:
+                self.progressBar["value"] = (
+                    100 * progress.bytes_read / progress.bytes_total
+                )
+            self.statsLabel["text"] = (
+                f"{progress.rows_read} rows read, {progress.rows_parsed} parsed"
+            )
+            self.after(POLL_MS, self.poll)
+        elif isinstance(self.error, ConversionCancelled):
+            self.master.switch_frame(BankSelection)
+        elif self.error is not None:
+            selection = self.master.switch_frame(BankSelection)
+            Error(selection, self.error)
+        else:
+            self.master.switch_frame(Report, self.result)
+
+
 class Report(Frame):
     def __init__(self, master, args):
         Frame.__init__(self, master)
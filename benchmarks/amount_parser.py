@@ -0,0 +1,88 @@
+"""Micro-benchmark of TransactionValueParser.parse
+
+Compares the parser against the original three-regex implementation and
+reports the time it takes to parse one million amount cells.
+
+Run from the repository root:
+
+    python -m benchmarks.amount_parser
+"""
+
+import argparse
+from decimal import Decimal
+import random
+import re
+import timeit
+
+from src.config import CurrencyFormat
+from src.converter import TransactionValueParser
+
+
+class RegexValueParser:
+    """The original parser: two ``re.sub`` passes and one ``re.search``"""
+
+    _fraction_tag = "decimals"
+
+    def __init__(self, config: CurrencyFormat):
+        self._thousands_match = re.compile(rf"{re.escape(config.thousands_sep)}")
+        re_decimal_point = re.escape(config.decimal_point)
+        self._fractional_match = re.compile(
+            rf"{re_decimal_point}(?P<{self._fraction_tag}>[0-9][0-9]?(?![0-9]))"
+        )
+        self._decimal_match = re.compile(r"-?[0-9]+(\.[0-9][0-9]?)?")
+
+    def parse(self, value: str) -> Decimal | None:
+        no_thousands_groups = re.sub(self._thousands_match, "", value)
+        replaced_decimal = re.sub(
+            self._fractional_match,
+            "." + rf"\g<{self._fraction_tag}>",
+            no_thousands_groups,
+        )
+        number_only = re.search(self._decimal_match, replaced_decimal)
+        if number_only is None:
+            return None
+
+        return Decimal(number_only[0])
+
+
+def make_cells(config: CurrencyFormat, n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    cells = []
+    for _ in range(n):
+        units = rng.randint(-500_000, 500_000)
+        whole = f"{abs(units) // 100:,}".replace(",", config.thousands_sep)
+        sign = "-" if units < 0 else ""
+        cells.append(f"{sign}{whole}{config.decimal_point}{abs(units) % 100:02d}")
+
+    return cells
+
+
+def per_million(parse, cells: list[str], repeat: int) -> float:
+    run = lambda: [parse(c) for c in cells]
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best * 1_000_000 / len(cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--cells", type=int, default=200_000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    formats = {
+        "revolut": CurrencyFormat(thousands_sep="", decimal_point="."),
+        "ica": CurrencyFormat(thousands_sep=" ", decimal_point=","),
+        "en": CurrencyFormat(thousands_sep=",", decimal_point="."),
+    }
+    for name, config in formats.items():
+        cells = make_cells(config, args.cells)
+        old = per_million(RegexValueParser(config).parse, cells, args.repeat)
+        new = per_million(TransactionValueParser(config).parse, cells, args.repeat)
+        print(
+            f"{name:>8}: regex {old:6.2f} s/M cells, "
+            f"current {new:6.2f} s/M cells ({old / new:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark the Converter stage by stage on synthetic statements.
+
+A statement is generated for every bank config in banks/ and converted in a
+fresh process per bank. The pipeline is run up to each stage in turn (read,
+read + parse, read + parse + write), and the time of a stage is the
+difference to the previous run. The results are written as JSON so they can
+be compared between commits.
+
+Run from the repository root:
+
+    python -m benchmarks.pipeline --rows 200000 --output bench.json
+    python -m benchmarks.pipeline --rows 200000 --compare bench.json
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import json
+import multiprocessing
+from pathlib import Path
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import warnings
+
+from src.config import BankConfig
+from src.converter import Converter
+
+from .synthetic import write_statement
+
+BANK_DIR = Path("banks")
+
+
+def _time(run) -> float:
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def _consume(rows):
+    for _ in rows:
+        pass
+
+
+def benchmark_bank(config_path: Path, n_rows: int, repeat: int) -> dict:
+    """Benchmark one bank config; meant to run in a fresh process"""
+    warnings.simplefilter("ignore")  # empty rows are reported by warnings
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        statement_csv = Path(tmp_dir) / "statement.csv"
+        output_csv = Path(tmp_dir) / "ynabImport.csv"
+        write_statement(config_path, statement_csv, n_rows)
+
+        def read():
+            c = Converter(BankConfig.from_file(config_path))
+            _consume(c.readInput(statement_csv, []))
+
+        def parse():
+            c = Converter(BankConfig.from_file(config_path))
+            _consume(c.parseRows(c.readInput(statement_csv, [])))
+
+        def write():
+            c = Converter(BankConfig.from_file(config_path))
+            c.convert(statement_csv, [], output_csv)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            cumulative = [
+                min(_time(run) for _ in range(repeat)) for run in (read, parse, write)
+            ]
+
+        stages = dict(zip(["read", "parse", "write"], cumulative))
+        stages["parse"] -= cumulative[0]
+        stages["write"] -= cumulative[1]
+
+        return {
+            "rows": n_rows,
+            "bytes": statement_csv.stat().st_size,
+            "seconds": cumulative[-1],
+            "rows_per_sec": n_rows / cumulative[-1],
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "stages": stages,
+        }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        )
+    except OSError:
+        return None
+
+    return out.stdout.strip() or None
+
+
+def run(n_rows: int, repeat: int) -> dict:
+    banks = {}
+    configs = sorted(BANK_DIR.glob("*.toml"))
+    spawn = multiprocessing.get_context("spawn")  # isolate the peak RSS per bank
+    for config_path in configs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            result = executor.submit(benchmark_bank, config_path, n_rows, repeat)
+            banks[config_path.stem] = result.result()
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "banks": banks,
+    }
+
+
+def report(results: dict, baseline: dict | None = None):
+    print(f"commit {results['commit']}, python {results['python']}")
+    for bank, r in results["banks"].items():
+        stages = ", ".join(f"{k} {v:.2f}s" for k, v in r["stages"].items())
+        line = (
+            f"{bank:>16}: {r['rows_per_sec']:>9,.0f} rows/s, "
+            f"peak RSS {r['peak_rss_kb'] / 1024:.0f} MiB ({stages})"
+        )
+        if baseline is not None and bank in baseline["banks"]:
+            ratio = r["rows_per_sec"] / baseline["banks"][bank]["rows_per_sec"]
+            line += f" [{ratio:.2f}x vs {baseline['commit']}]"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--rows", type=int, default=100_000)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON results to compare with")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.repeat)
+    baseline = None
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+    report(results, baseline)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
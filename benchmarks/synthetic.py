@@ -0,0 +1,90 @@
+"""Synthetic bank statements for benchmarking.
+
+Statements are generated from a bank config so that they use the bank's
+delimiter, date format, thousands separator and decimal point. Amounts are
+quoted when they contain the delimiter (and at random otherwise), and empty
+rows are sprinkled in.
+"""
+
+from datetime import date, timedelta
+from pathlib import Path
+import random
+
+from src.config import BankConfig, TransactionFormat
+
+FILLER_COLUMNS = ["Reference", "Balance", "Currency"]
+PAYEES = ["Supermarket", "Paypal *somestore", "Top-Up", "Train", "Salary", "Café"]
+
+
+def format_amount(units: int, config: BankConfig) -> str:
+    currency = config.currency_format
+    whole, fraction = divmod(abs(units), 10**currency.decimals)
+    grouped = f"{whole:,}".replace(",", currency.thousands_sep)
+    sign = "-" if units < 0 else ""
+    if currency.decimals == 0:
+        return f"{sign}{grouped}"
+
+    return f"{sign}{grouped}{currency.decimal_point}{fraction:0{currency.decimals}d}"
+
+
+def _quote(value: str, delimiter: str, always: bool = False) -> str:
+    if always or delimiter in value or '"' in value or "\n" in value:
+        return '"' + value.replace('"', '""') + '"'
+
+    return value
+
+
+def statement_rows(
+    config: BankConfig, n_rows: int, seed: int = 0, empty_every: int = 500
+):
+    """Yield the lines of a statement (header first) for a fresh config"""
+    rng = random.Random(seed)
+    delimiter = config.csv_delimiter
+
+    text_columns = {
+        config.payee_column: lambda: rng.choice(PAYEES),
+        config.memo_column: lambda: f"Memo {rng.randint(0, 10**6)}",
+        config.category_column: lambda: "Everyday Expenses: Groceries",
+    }
+    text_columns.pop(None, None)
+    transaction_columns = config.transaction_columns
+    header = [
+        config.date_column,
+        *text_columns,
+        *(tc.header_key for tc in transaction_columns),
+        *FILLER_COLUMNS,
+    ]
+    yield delimiter.join(_quote(h, delimiter) for h in header)
+
+    day = date(2015, 1, 1)
+    for i in range(n_rows):
+        if empty_every and i % empty_every == empty_every - 1:
+            yield delimiter * (len(header) - 1)
+            continue
+
+        day += timedelta(days=rng.random() < 0.2)
+        fields = [day.strftime(config.date_format)]
+        fields.extend(make_text() for make_text in text_columns.values())
+        for tc in transaction_columns:
+            units = rng.randint(1, 2_000_000)
+            match tc.transaction_format:
+                case TransactionFormat.AMOUNT:
+                    value = format_amount(
+                        -units if rng.random() < 0.8 else units, config
+                    )
+                case TransactionFormat.OUTFLOW | TransactionFormat.INFLOW:
+                    is_used = rng.random() < 0.5
+                    value = format_amount(units, config) if is_used else ""
+            fields.append(value)
+        fields.extend([f"{rng.randint(0, 10**9)}", format_amount(units, config), "SEK"])
+
+        yield delimiter.join(
+            _quote(f, delimiter, always=rng.random() < 0.1) for f in fields
+        )
+
+
+def write_statement(config_path: Path, statement_csv: Path, n_rows: int, seed: int = 0):
+    config = BankConfig.from_file(config_path)  # un-normalized column names
+    with statement_csv.open("w", encoding="utf-8", newline="") as f:
+        for line in statement_rows(config, n_rows, seed):
+            f.write(line + "\r\n")
@@ -1,7 +1,13 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import os
 import re
+import sys
+import tempfile
+import time
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional
 
 
 class NumberQuoter:
@@ -20,6 +26,8 @@ class NumberQuoter:
                 self._group_tag, match_number_with_thousands_sep
             )
         )
+        # the same pattern for UTF-8 encoded files, which are searched as bytes
+        self._bytes_pattern = re.compile(self._pattern.pattern.encode("utf-8"))
 
     def quote_str_number(self, string: str) -> str:
         """Surround numbers with thousands seperators in quotes.
@@ -27,6 +35,32 @@ class NumberQuoter:
         """
         return self._pattern.sub(fr'"\g<{self._group_tag}>"', string)
 
+    def quote_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """Quote the numbers of one line at a time.
+        Numbers never span lines, so this is the same as quoting all lines at
+        once. It can be used as a filter of the lines read by the converter,
+        e.g., ``bank2ynab(..., line_filter=NumberQuoter().quote_lines)``.
+        """
+        sub, repl = self._pattern.sub, fr'"\g<{self._group_tag}>"'
+        for line in lines:
+            yield sub(repl, line)
+
+    def quote_buffer(self, buffer, out: BinaryIO) -> None:
+        """Write a UTF-8 encoded buffer (e.g. a memory map) with numbers quoted.
+        The same numbers are quoted as by ``quote_str_number``, but the buffer is
+        neither decoded nor copied: the unchanged parts are written from a view.
+        """
+        with memoryview(buffer) as view:
+            pos = 0
+            for match in self._bytes_pattern.finditer(buffer):
+                start, end = match.span()
+                out.write(view[pos:start])
+                out.write(b'"')
+                out.write(view[start:end])
+                out.write(b'"')
+                pos = end
+            out.write(view[pos:])
+
 
 def quote_numbers(
     file: Path,
@@ -67,6 +101,10 @@ def quote_numbers(
         Defaults to ``2``.
     :returns: Path to the fixed file.
     :raises ValueError: if the arguments are invalid
+
+    The fixed file is first written to a temporary file in the destination
+    directory, and then renamed. Hence, ``file`` is left as it was if the fix
+    fails, even if it is to be replaced.
     """
     if replace and out_dir is not None:
         raise ValueError(f"arguments {replace=} and {out_dir=} are mutually exclusive")
@@ -76,25 +114,127 @@ def quote_numbers(
         raise ValueError(f"{out_dir=} is not a directory")
 
     nq = NumberQuoter(**numberquoter_kwargs)
-    new_file_contents = nq.quote_str_number(file.read_text())
 
     new_name = file.stem + "_OUT" + file.suffix
+    new_file = file
     if not replace:
-        file = file.with_name(new_name)
+        new_file = file.with_name(new_name)
 
     if out_dir is not None:  # guaranteed to be a directory
-        file = out_dir / new_name
+        new_file = out_dir / new_name
+
+    # The statement is memory mapped and searched as bytes, so it is never
+    # read into memory as a whole.
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=f".{new_file.name}.", dir=new_file.parent.resolve()
+    )
+    try:
+        with open(fd, "wb") as out, file.open("rb") as f:
+            if os.fstat(f.fileno()).st_size > 0:  # an empty file can't be mapped
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as statement:
+                    nq.quote_buffer(statement, out)
+        os.chmod(tmp_name, file.stat().st_mode & 0o777)  # mkstemp's mode is 0o600
+        os.replace(tmp_name, new_file)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+    return new_file
+
+
+def quote_stream(src: BinaryIO, out: BinaryIO, **numberquoter_kwargs) -> None:
+    """Fix a UTF-8 encoded statement that is read from a stream, e.g. stdin.
+    The statement is fixed line by line, so it is never held in memory.
+    """
+    nq = NumberQuoter(**numberquoter_kwargs)
+    lines = (line.decode("utf-8") for line in src)
+    out.writelines(line.encode("utf-8") for line in nq.quote_lines(lines))
+
+
+class QuoteResult(NamedTuple):
+    file: Path
+    fixed: Optional[Path]  # None if the file couldn't be fixed
+    size: int  # bytes
+    seconds: float
+    error: Optional[str] = None
+
+
+def expand_files(paths: Iterable[Path]) -> list[Path]:
+    """Expand directories to the CSV files in them
+    Files that were written by ``quote_numbers`` (i.e., '*_OUT.csv') are
+    skipped in directories, so that fixing a directory twice is harmless.
+    """
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(
+                f
+                for f in sorted(path.glob("*.csv"))
+                if f.is_file() and not f.stem.endswith("_OUT")
+            )
+        else:
+            files.append(path)
+
+    return files
+
+
+def _timed_quote_numbers(
+    file: Path, replace: bool, out_dir: Optional[Path], numberquoter_kwargs: dict
+) -> QuoteResult:
+    start = time.perf_counter()
+    try:
+        size = file.stat().st_size
+        fixed = quote_numbers(
+            file, replace=replace, out_dir=out_dir, **numberquoter_kwargs
+        )
+    except (OSError, ValueError) as e:
+        return QuoteResult(file, None, 0, time.perf_counter() - start, f"{e}")
+
+    return QuoteResult(file, fixed, size, time.perf_counter() - start)
+
 
-    file.write_text(new_file_contents)
+def quote_many(
+    files: list[Path],
+    *,
+    replace: bool = False,
+    out_dir: Optional[Path] = None,
+    max_workers: Optional[int] = None,
+    **numberquoter_kwargs,
+) -> list[QuoteResult]:
+    """
+    Fix many files with ``quote_numbers`` on a process pool.
+
+    The arguments are the same as for ``quote_numbers``, and ``max_workers``
+    is the number of processes (defaults to the number of CPUs).
+    A single file is fixed in this process.
+
+    :returns: the result of each file, in the order of ``files``. Files that
+        couldn't be fixed have an error instead of a fixed file.
+    """
+    args = (replace, out_dir, numberquoter_kwargs)
+    if len(files) == 1:
+        return [_timed_quote_numbers(files[0], *args)]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_timed_quote_numbers, file, *args) for file in files]
+        return [future.result() for future in futures]
 
-    return file
+
+def _throughput(size: int, seconds: float) -> str:
+    mb = size / 2**20
+    return f"{mb:.1f} MB in {seconds:.2f} s ({mb / max(seconds, 1e-9):.1f} MB/s)"
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Makes sure all values with thousands separators are in quotes in an exported CSV file from Revolut."
     )
-    parser.add_argument("file", type=Path, help="path to the CSV statement file")
+    parser.add_argument(
+        "files",
+        type=Path,
+        nargs="+",
+        help="CSV statement files or directories of them, or '-' to fix stdin and write it to stdout",
+    )
     group = parser.add_mutually_exclusive_group()
     group.add_argument(
         "--replace", action="store_true", help="replace the original statement file"
@@ -115,16 +255,48 @@ def main():
         default=2,
         help="number of decimal digits used in the input file",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of processes that fix files in parallel (defaults to the number of CPUs)",
+    )
 
     args = parser.parse_args()
-    quote_numbers(
-        args.file,
-        replace=args.replace,
-        out_dir=args.out,
+    numberquoter_kwargs = dict(
         thousands_sep=args.thousands_sep,
         decimal_sep=args.decimal_sep,
         n_decimals=args.percision,
     )
+    if any(str(file) == "-" for file in args.files):
+        if len(args.files) > 1 or args.replace or args.out is not None:
+            parser.error("stdin is fixed to stdout, not to a file")
+        quote_stream(sys.stdin.buffer, sys.stdout.buffer, **numberquoter_kwargs)
+        return
+
+    start = time.perf_counter()
+    results = quote_many(
+        expand_files(args.files),
+        replace=args.replace,
+        out_dir=args.out,
+        max_workers=args.jobs,
+        **numberquoter_kwargs,
+    )
+    seconds = time.perf_counter() - start
+
+    for r in results:
+        if r.error is not None:
+            print(f"FAILED {r.file}: {r.error}")
+        else:
+            print(f"{r.file} -> {r.fixed}: {_throughput(r.size, r.seconds)}")
+
+    fixed = [r for r in results if r.error is None]
+    total_size = sum(r.size for r in fixed)
+    print(
+        f"{len(fixed)}/{len(results)} file(s) fixed, {_throughput(total_size, seconds)}"
+    )
+    sys.exit(0 if len(fixed) == len(results) else 1)
 
 
 if __name__ == "__main__":
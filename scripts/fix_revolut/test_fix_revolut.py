@@ -1,4 +1,5 @@
 from decimal import Decimal
+import io
 from pathlib import Path
 import random
 
@@ -161,6 +162,21 @@ def test_inject_into_text(large_nums, large_nums_in_quotes, data):
     assert len(_quoter._pattern.findall(test_string)) == n_bad_format
 
 
+@settings(max_examples=10 ** 3)
+@given(list_of_large_number, list_of_large_number_in_quotes, data())
+def test_quote_buffer(large_nums, large_nums_in_quotes, data):
+    """Quoting the bytes of a string is the same as quoting the string"""
+    some_text = lambda: data.draw(text(max_size=16))
+    test_string = "".join(
+        f"{some_text()},{num},{some_text()}"
+        for num in large_nums + large_nums_in_quotes
+    )
+
+    out = io.BytesIO()
+    _quoter.quote_buffer(test_string.encode("utf-8"), out)
+    assert out.getvalue().decode("utf-8") == put_into_quotes(test_string)
+
+
 # ----------- PyTest unit tests -----------
 
 
@@ -260,3 +276,73 @@ def test_failed_generated_test_1():
     expected = '"1,000.00""1,000.00"'
     with pytest.raises(AssertionError):
         assert put_into_quotes(test_str) == expected
+
+
+def test_empty_file(tmpdir):
+    empty = Path(tmpdir) / "empty.csv"
+    empty.write_bytes(b"")
+    assert fix_revolut.quote_numbers(empty, replace=True).read_bytes() == b""
+
+
+def test_bom_is_kept(tmpdir):
+    statement = Path(tmpdir) / "bom.csv"
+    statement.write_bytes(b"\xef\xbb\xbfAmount,Fee\n1,000.00,1.00\n")
+    quoted_file = fix_revolut.quote_numbers(statement)
+    assert quoted_file.read_bytes() == b'\xef\xbb\xbfAmount,Fee\n"1,000.00",1.00\n'
+
+
+def test_quote_lines(csv_path):
+    revolut_statement = csv_path.read_text()
+    lines = revolut_statement.splitlines(keepends=True)
+    quoted = "".join(_quoter.quote_lines(lines))
+    assert quoted == put_into_quotes(revolut_statement)
+
+
+def test_quote_stream(csv_path):
+    out = io.BytesIO()
+    fix_revolut.quote_stream(io.BytesIO(csv_path.read_bytes()), out)
+    assert out.getvalue().decode("utf-8") == put_into_quotes(csv_path.read_text())
+
+
+def test_failed_replace_keeps_file(tmpdir, csv_path, monkeypatch):
+    """The statement is left as it was if it can't be fixed."""
+    revolut_statement = csv_path.read_bytes()
+    tmp_csv_path = Path(tmpdir) / csv_path.name
+    tmp_csv_path.write_bytes(revolut_statement)
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(fix_revolut.NumberQuoter, "quote_buffer", fail)
+    with pytest.raises(OSError):
+        fix_revolut.quote_numbers(tmp_csv_path, replace=True)
+
+    assert tmp_csv_path.read_bytes() == revolut_statement
+    assert list(Path(tmpdir).iterdir()) == [tmp_csv_path]  # no temporary file
+
+
+def test_expand_files(tmpdir, csv_path):
+    tmpdir = Path(tmpdir)
+    for name in ["a.csv", "b.csv", "b_OUT.csv", "notes.txt"]:
+        (tmpdir / name).write_bytes(csv_path.read_bytes())
+
+    files = fix_revolut.expand_files([tmpdir, csv_path])
+    assert files == [tmpdir / "a.csv", tmpdir / "b.csv", csv_path]
+
+
+def test_quote_many(tmpdir, csv_path):
+    tmpdir = Path(tmpdir)
+    files = []
+    for name in ["a.csv", "b.csv", "c.csv"]:
+        (file := tmpdir / name).write_bytes(csv_path.read_bytes())
+        files.append(file)
+    files.append(tmpdir / "missing.csv")
+
+    results = fix_revolut.quote_many(files, replace=True, max_workers=2)
+
+    assert [r.file for r in results] == files
+    for r in results[:-1]:
+        assert r.error is None and r.fixed == r.file
+        assert r.size == csv_path.stat().st_size
+        assert r.fixed.read_text() == put_into_quotes(csv_path.read_text())
+    assert results[-1].fixed is None and results[-1].error is not None
@@ -0,0 +1,669 @@
+"""Convert many bank statements in parallel.
+
+Each statement is paired with a bank config, or with the config that its
+header matches (see detect.py), and converted in its own worker process.
+Either one YNAB csv-file is written per statement, or all conversions are
+merged into a single file. Large statements can also be split into chunks
+of whole records that are converted in parallel.
+
+Run from the repository root, for example:
+
+    python -m src.batch -b banks/revolut_v2.toml 'exports/*.csv' -o converted/
+    python -m src.batch 'exports/*.csv' -o converted/  # detect the banks
+"""
+
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
+import contextlib
+import functools
+import glob
+import itertools
+import os
+from pathlib import Path
+import secrets
+import shutil
+import sys
+import tempfile
+from typing import Iterable, NamedTuple, TypeAlias
+
+from .converter import Converter, readIgnore
+from .dedup import DedupIndex, dedup_csv
+from .detect import detect_bank
+from .diagnostics import Diagnostics
+from .incremental import Watermark, WatermarkStore
+from .metrics import ConversionMetrics
+from .profiling import PROFILERS, profile
+from .reader import MappedStatement
+from .registry import load_config
+
+BANK_DIR = Path(__file__).parent.parent / "banks"
+
+ByteRange: TypeAlias = tuple[int, int]
+# the tuple returned by bank2ynab, the new watermark and the metrics
+Outcome: TypeAlias = tuple[tuple, Watermark | None, ConversionMetrics]
+
+
+class BatchJob(NamedTuple):
+    config_path: Path
+    statement_csv: Path
+    account: str = ""  # only used for incremental conversions
+    encoding: str = "utf-8"  # of the statement, e.g. as detected from its header
+
+
+class BatchResult(NamedTuple):
+    job: BatchJob
+    output_csv: Path
+    result: tuple | None  # the tuple returned by bank2ynab
+    error: str | None = None
+    watermark: Watermark | None = None
+    metrics: ConversionMetrics | None = None
+
+    @property
+    def converted(self) -> bool:
+        return self.result is not None and self.result[0]
+
+    @property
+    def up_to_date(self) -> bool:
+        """Whether nothing was converted since all rows were converted before"""
+        if self.result is None or self.converted or self.metrics is None:
+            return False
+
+        return self.metrics.rows["skipped"] + self.metrics.rows["duplicate"] > 0
+
+
+def find_bank_config(bank: str) -> Path:
+    """Resolve a path to a TOML config, or the name of a config in banks/"""
+    if (path := Path(bank)).is_file():
+        return path
+
+    if (path := BANK_DIR / f"{bank}.toml").is_file():
+        return path
+
+    raise ValueError(f"'{bank}' is neither a TOML file nor a config in {BANK_DIR}")
+
+
+def expand_statements(patterns: Iterable[str]) -> list[Path]:
+    """Expand files, directories (all *.csv files) and glob patterns"""
+    statements = []
+    for pattern in patterns:
+        if (path := Path(pattern)).is_dir():
+            matches = sorted(path.glob("*.csv"))
+        elif path.is_file():
+            matches = [path]
+        else:
+            matches = sorted(Path(m) for m in glob.glob(pattern, recursive=True))
+
+        if len(matches) == 0:
+            raise ValueError(f"No statement files found for '{pattern}'")
+        statements.extend(m for m in matches if m.is_file())
+
+    return statements
+
+
+def _output_names(jobs: list[BatchJob]) -> list[str]:
+    names = []
+    for job in jobs:
+        name = f"{job.statement_csv.stem}_ynab.csv"
+        n = 1
+        while name in names:  # statements from different dirs may share a name
+            name = f"{job.statement_csv.stem}_{n}_ynab.csv"
+            n += 1
+        names.append(name)
+
+    return names
+
+
+def split_statement(
+    statement_csv: Path, chunk_size: int
+) -> tuple[int, list[ByteRange]]:
+    """Split a statement into byte ranges of whole records
+
+    Chunks are at least ``chunk_size`` bytes (except for the last one) and
+    end on a line ending that is outside quotes, i.e., with an even number of
+    quotation marks since the start of the chunk. Quoted newlines therefore
+    never split a record.
+
+    :returns: the length of the header in bytes, and the byte ranges of the
+        chunks that follow it.
+    """
+    ends = []
+    with MappedStatement(statement_csv) as statement:
+        size = len(statement)
+        start, target = 0, 0  # the first "chunk" is the header
+        while target < size:
+            # count the quotes up to the target in large blocks ...
+            quotes = statement.count(b'"', start, target)
+
+            # ... and then line by line until the record ends
+            pos = target
+            while pos < size:
+                line_end = statement.line_end(pos)
+                quotes += statement.count(b'"', pos, line_end)
+                pos = line_end
+                if quotes % 2 == 0:
+                    break
+
+            start = pos
+            ends.append(start)
+            target = start + chunk_size
+
+    if len(ends) == 0:
+        raise ValueError(f"{statement_csv} is empty")
+    elif ends[-1] < size:
+        ends.append(size)  # the last chunk is smaller than chunk_size
+
+    header_end, *chunk_ends = ends
+    chunk_starts = [header_end] + chunk_ends[:-1]
+    return header_end, list(zip(chunk_starts, chunk_ends))
+
+
+def first_lines(statement_csv: Path, chunks: list[ByteRange]) -> list[int]:
+    """The line number (from 1) in the statement of the first line of each chunk"""
+    lines, line, pos = [], 1, 0
+    with MappedStatement(statement_csv) as statement:
+        for start, _ in chunks:
+            line += statement.count(statement.newline, pos, start)
+            lines.append(line)
+            pos = start
+
+    return lines
+
+
+class Profiling(NamedTuple):
+    prof_file: Path
+    profiler: str
+
+
+def _profile(profiling: Profiling | None):
+    if profiling is None:
+        return contextlib.nullcontext()
+
+    return profile(profiling.prof_file, profiling.profiler)
+
+
+def _convert(
+    job: BatchJob,
+    output_csv: Path,
+    toIgnore: list[str],
+    watermark: Watermark | None = None,
+    profiling: Profiling | None = None,
+    rejects_csv: Path | None = None,
+) -> Outcome:
+    bank = load_config(job.config_path)
+    diagnostics = Diagnostics(rejects_csv=rejects_csv)
+    converter = Converter(
+        config=bank,
+        watermark=watermark,
+        diagnostics=diagnostics,
+        encoding=job.encoding,
+    )
+    with _profile(profiling):
+        hasConverted = converter.convert(job.statement_csv, toIgnore, output_csv)
+    result = (hasConverted, *converter.counts())
+    return result, converter.watermark, converter.metrics
+
+
+def _convert_chunk(
+    job: BatchJob,
+    header_end: int,
+    chunk: ByteRange,
+    output_csv: Path,
+    toIgnore: list[str],
+    profiling: Profiling | None = None,
+    rejects_csv: Path | None = None,
+    line_offset: int = 0,
+) -> Outcome:
+    bank = load_config(job.config_path)
+    converter = Converter(config=bank, diagnostics=Diagnostics(rejects_csv=rejects_csv))
+
+    start, end = chunk
+    name = f"{job.statement_csv} (bytes {start}-{end})"
+    with MappedStatement(job.statement_csv, job.encoding) as statement, _profile(
+        profiling
+    ):
+        lines = itertools.chain(
+            statement.lines(statement.start, header_end), statement.lines(start, end)
+        )
+        # the header is read along with the chunk, so the line numbers of
+        # its rows are offset by the lines between the header and the chunk
+        bankData = converter.readCsv(
+            lines, toIgnore, name=name, line_offset=line_offset
+        )
+        parsed = converter.parseRows(bankData)
+        try:
+            hasConverted = converter.writeOutput(parsed, output_csv)
+        finally:
+            converter.diagnostics.close()
+    converter.metrics.bytes_read += end - start
+
+    return (hasConverted, *converter.counts()), None, converter.metrics
+
+
+def _submit(
+    executor: ProcessPoolExecutor,
+    job: BatchJob,
+    output_csv: Path,
+    chunk_dir: Path,
+    chunk_size: int | None,
+    toIgnore: list[str],
+    watermark: Watermark | None,
+    profiling: Profiling | None = None,
+    rejects_csv: Path | None = None,
+) -> list[tuple[Path, Future]]:
+    chunks = []
+    if chunk_size is not None and job.statement_csv.stat().st_size > chunk_size:
+        header_end, chunks = split_statement(job.statement_csv, chunk_size)
+
+    if len(chunks) < 2:
+        args = (job, output_csv, toIgnore, watermark, profiling, rejects_csv)
+        return [(output_csv, executor.submit(_convert, *args))]
+
+    lines = first_lines(job.statement_csv, chunks)
+    submitted = []
+    for i, chunk in enumerate(chunks):
+        chunk_csv = chunk_dir / f"{output_csv.stem}_{i}.csv"
+        chunk_profiling = None
+        if profiling is not None:  # one profile per chunk
+            prof_file = profiling.prof_file
+            chunk_profiling = profiling._replace(
+                prof_file=prof_file.with_name(f"{prof_file.stem}_{i}.prof")
+            )
+        chunk_rejects = None
+        if rejects_csv is not None:
+            chunk_rejects = rejects_csv.with_name(f"{rejects_csv.stem}_{i}.csv")
+        args = (
+            job,
+            header_end,
+            chunk,
+            chunk_csv,
+            toIgnore,
+            chunk_profiling,
+            chunk_rejects,
+            lines[i] - lines[0],
+        )
+        submitted.append((chunk_csv, executor.submit(_convert_chunk, *args)))
+
+    return submitted
+
+
+def _collect(output_csv: Path, submitted: list[tuple[Path, Future]]) -> Outcome:
+    """Wait for all chunks of a job and merge them into ``output_csv``"""
+    outcomes = [future.result() for _, future in submitted]
+    if len(submitted) == 1:
+        return outcomes[0]
+
+    results, _, chunk_metrics = zip(*outcomes)
+    metrics = functools.reduce(ConversionMetrics.merge, chunk_metrics)
+    converted = [csv_file for (csv_file, _), r in zip(submitted, results) if r[0]]
+    if converted:
+        _concat_csv(converted, output_csv)
+
+    counts = (sum(column) for column in list(zip(*results))[1:])
+    return (len(converted) > 0, *counts), None, metrics
+
+
+def convert_many(
+    jobs: list[BatchJob],
+    out_dir: Path,
+    *,
+    merge: str | None = None,
+    max_workers: int | None = None,
+    chunk_size: int | None = None,
+    toIgnore: list[str] | None = None,
+    watermarks: WatermarkStore | None = None,
+    dedup: DedupIndex | None = None,
+    profiler: str | None = None,
+    rejects: bool = False,
+) -> list[BatchResult]:
+    """Convert all jobs on a process pool
+
+    One output file is written to ``out_dir`` per job, named after the
+    statement. If ``merge`` is set, the converted rows of all jobs are
+    instead concatenated (in the order of ``jobs``) into ``out_dir / merge``,
+    which is left as it was if none of them converted anything.
+
+    Statements larger than ``chunk_size`` bytes are split into chunks that
+    are converted in parallel and merged back in their original order.
+
+    If ``watermarks`` are given, only transactions newer than the watermark
+    of each job's bank and account are converted, and the watermarks of the
+    successful jobs are saved afterwards. Jobs of the same bank and account
+    are converted one after another, each from the watermark of the one
+    before it. This can't be combined with chunks.
+
+    If a ``dedup`` index is given, transactions already in the index are
+    dropped from the outputs, in the order of ``jobs``, after all
+    conversions have finished.
+
+    If a ``profiler`` is given ('cprofile' or 'pyinstrument'), then each
+    conversion is profiled, and a '<statement>_ynab.prof' file and a summary
+    of it are written to ``out_dir`` per job (or per chunk).
+
+    If ``rejects`` is set, then the rows that could not be converted are
+    written to a '<statement>_ynab_rejects.csv' file in ``out_dir`` per job
+    (or per chunk), if there are any.
+
+    Conversion errors are reported in the results rather than raised.
+    """
+    if not out_dir.is_dir():
+        raise ValueError(f"{out_dir=} is not a directory")
+    elif watermarks is not None and chunk_size is not None:
+        raise ValueError("Incremental conversions can't be split into chunks")
+    elif profiler is not None and profiler not in PROFILERS:
+        raise ValueError(f"Unknown {profiler=}, expected one of {PROFILERS}")
+    toIgnore = [] if toIgnore is None else toIgnore
+    banks = {}
+    if watermarks is not None:
+        for job in jobs:
+            banks[job] = load_config(job.config_path).name
+
+    with tempfile.TemporaryDirectory(dir=out_dir) as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        write_dir = out_dir if merge is None else tmp_dir
+        outputs = [write_dir / name for name in _output_names(jobs)]
+
+        outcomes, errors = {}, {}
+        handed_on = {}  # the watermark of each bank and account after a wave
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for wave in _waves(jobs, banks):
+                submitted = {}
+                for i in wave:
+                    job, output_csv = jobs[i], outputs[i]
+                    try:
+                        watermark = None
+                        if watermarks is not None:
+                            key = (banks[job], job.account)
+                            watermark = handed_on.get(key) or watermarks.get(*key)
+                        profiling = None
+                        if profiler is not None:
+                            profiling = Profiling(
+                                out_dir / f"{output_csv.stem}.prof", profiler
+                            )
+                        rejects_csv = None
+                        if rejects:
+                            rejects_csv = out_dir / f"{output_csv.stem}_rejects.csv"
+                        submitted[i] = _submit(
+                            executor,
+                            job,
+                            output_csv,
+                            tmp_dir,
+                            chunk_size,
+                            toIgnore,
+                            watermark,
+                            profiling,
+                            rejects_csv,
+                        )
+                    except (OSError, ValueError) as e:
+                        errors[i] = f"{e}"
+
+                for i, futures in submitted.items():
+                    try:
+                        outcomes[i] = _collect(outputs[i], futures)
+                    except (OSError, ValueError, TypeError, RuntimeError) as e:
+                        errors[i] = f"{e}"
+                        continue
+
+                    (hasConverted, *_), watermark, _ = outcomes[i]
+                    if hasConverted and watermark is not None:
+                        handed_on[banks[jobs[i]], jobs[i].account] = watermark
+
+        results = []
+        for i, (job, output_csv) in enumerate(zip(jobs, outputs)):
+            if i in errors:
+                results.append(BatchResult(job, output_csv, None, errors[i]))
+            else:
+                result, watermark, metrics = outcomes[i]
+                results.append(
+                    BatchResult(job, output_csv, result, None, watermark, metrics)
+                )
+
+        if dedup is not None:
+            results = _drop_duplicates(dedup, results)
+
+        # Don't leave the output of an earlier run behind for the statements
+        # that had nothing (new) to convert, but keep it if a conversion failed
+        for r in results:
+            if r.error is None and not r.converted:
+                r.output_csv.unlink(missing_ok=True)
+
+        if merge is not None:
+            merged_csv = out_dir / merge
+            if converted := [r.output_csv for r in results if r.converted]:
+                _concat_csv(converted, merged_csv)
+            results = [r._replace(output_csv=merged_csv) for r in results]
+
+    if watermarks is not None:
+        _save_watermarks(watermarks, banks, results)
+
+    return results
+
+
+def _waves(jobs: list[BatchJob], banks: dict[BatchJob, str]) -> list[list[int]]:
+    """Group the indices of the jobs into waves that are converted in turn
+
+    Jobs of the same bank and account (if their ``banks`` are given, i.e.,
+    for incremental conversions) are put in consecutive waves, in the order
+    of ``jobs``, so that each starts from the watermark the one before it
+    left. Overlapping statements of an account then don't convert the same
+    transactions twice. All other jobs are converted in the first wave.
+    """
+    waves: list[list[int]] = []
+    counts: dict[tuple[str, str], int] = {}
+    for i, job in enumerate(jobs):
+        n = 0
+        if job in banks:
+            key = (banks[job], job.account)
+            n = counts[key] = counts.get(key, -1) + 1
+        if n == len(waves):
+            waves.append([])
+        waves[n].append(i)
+
+    return waves
+
+
+def _drop_duplicates(
+    dedup: DedupIndex, results: list[BatchResult]
+) -> list[BatchResult]:
+    deduped = []
+    for r in results:
+        if r.converted:
+            dropped = dedup_csv(dedup, r.output_csv)
+            hasConverted, *counts, rowsParsed = r.result
+            # as with bank2ynab, nothing is written if all rows are duplicates
+            hasConverted = rowsParsed > dropped
+            r = r._replace(result=(hasConverted, *counts, rowsParsed - dropped))
+            if r.metrics is not None:
+                r.metrics.rows["parsed"] -= dropped
+                r.metrics.rows["duplicate"] += dropped
+        deduped.append(r)
+
+    dedup.commit()
+    return deduped
+
+
+def _save_watermarks(
+    watermarks: WatermarkStore, banks: dict[BatchJob, str], results: list[BatchResult]
+):
+    for r in results:
+        if r.converted and r.watermark is not None:
+            bank, account = banks[r.job], r.job.account
+            watermarks.set(
+                bank, account, watermarks.get(bank, account).merge(r.watermark)
+            )
+
+    watermarks.save()
+
+
+def _concat_csv(csv_files: list[Path], output_csv: Path):
+    """Concatenate csv-files that have the same header, atomically"""
+    tmp_csv = output_csv.with_name(f".{output_csv.name}.{secrets.token_hex(4)}.tmp")
+    try:
+        with tmp_csv.open("x", encoding="utf-8", newline="") as out:
+            for i, csv_file in enumerate(csv_files):
+                with csv_file.open(encoding="utf-8", newline="") as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(header)
+                    shutil.copyfileobj(f, out)
+        os.replace(tmp_csv, output_csv)
+    except BaseException:
+        tmp_csv.unlink(missing_ok=True)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert many bank statements to YNAB's csv format in parallel."
+    )
+    parser.add_argument(
+        "statements",
+        nargs="*",
+        help="statement files, directories or glob patterns converted with --bank",
+    )
+    parser.add_argument(
+        "-b",
+        "--bank",
+        help="bank config (TOML path or name of a config in banks/), "
+        "detected from the header of each statement if not given",
+    )
+    parser.add_argument(
+        "--pair",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("BANK", "STATEMENTS"),
+        help="convert the statements matching a pattern with their own bank config",
+    )
+    parser.add_argument(
+        "-o", "--out-dir", type=Path, default=Path.cwd(), help="output directory"
+    )
+    parser.add_argument(
+        "--merge", metavar="FILE", help="merge all conversions into this output file"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="number of worker processes"
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="only convert transactions newer than the watermarks in this state file",
+    )
+    parser.add_argument(
+        "--account",
+        default="",
+        help="the account the statements belong to (for --state)",
+    )
+    parser.add_argument(
+        "--dedup",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="drop transactions found in this index (SQLite) of earlier conversions",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=float,
+        default=None,
+        metavar="MB",
+        help="split statements larger than this into chunks converted in parallel",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="write timings and counters of all conversions (.prom or .json)",
+    )
+    parser.add_argument(
+        "--rejects",
+        action="store_true",
+        help="write the rows that could not be converted to the output directory",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="cprofile",
+        default=None,
+        choices=PROFILERS,
+        help="profile each conversion and write the profiles to the output directory",
+    )
+
+    args = parser.parse_args()
+    pairs = list(args.pair)
+    if args.statements and args.bank is not None:
+        pairs.extend((args.bank, pattern) for pattern in args.statements)
+    if len(pairs) == 0 and not args.statements:
+        parser.error("no statements to convert")
+
+    undetected = []  # statements that don't match any bank config
+    try:
+        jobs = [
+            BatchJob(find_bank_config(bank), statement, args.account)
+            for bank, pattern in pairs
+            for statement in expand_statements([pattern])
+        ]
+        if args.bank is None:
+            for statement in expand_statements(args.statements):
+                if (detection := detect_bank(statement, BANK_DIR)) is None:
+                    undetected.append(statement)
+                else:
+                    jobs.append(
+                        BatchJob(
+                            detection.config_path,
+                            statement,
+                            args.account,
+                            detection.encoding,
+                        )
+                    )
+    except ValueError as e:
+        parser.error(f"{e}")
+
+    if args.state is not None and args.chunk_size is not None:
+        parser.error("--state can't be combined with --chunk-size")
+
+    results = convert_many(
+        jobs,
+        args.out_dir,
+        merge=args.merge,
+        max_workers=args.jobs,
+        chunk_size=None if args.chunk_size is None else int(args.chunk_size * 2**20),
+        toIgnore=readIgnore(),
+        watermarks=None if args.state is None else WatermarkStore(args.state),
+        dedup=None if args.dedup is None else DedupIndex(args.dedup),
+        profiler=args.profile,
+        rejects=args.rejects,
+    )
+
+    for statement in undetected:
+        print(f"FAILED {statement}: no bank config matches its header")
+    for r in results:
+        if r.error is not None:
+            print(f"FAILED {r.job.statement_csv}: {r.error}")
+        elif r.up_to_date:
+            print(f"{r.job.statement_csv}: no new transactions")
+        elif not r.converted:
+            print(f"FAILED {r.job.statement_csv}: nothing to convert")
+        else:
+            _, blankRows, ignoredRows, linesRead, rowsParsed = r.result
+            print(
+                f"{r.job.statement_csv} -> {r.output_csv}: "
+                f"{rowsParsed}/{linesRead} rows parsed "
+                f"({blankRows} blank, {ignoredRows} ignored)"
+            )
+
+    if args.metrics is not None:
+        collected = [r.metrics for r in results if r.metrics is not None]
+        functools.reduce(ConversionMetrics.merge, collected, ConversionMetrics()).write(
+            args.metrics
+        )
+
+    n_converted = sum(r.converted or r.up_to_date for r in results)
+    n_statements = len(results) + len(undetected)
+    print(f"{n_converted}/{n_statements} statement(s) converted.")
+    sys.exit(0 if n_converted == n_statements else 1)
+
+
+if __name__ == "__main__":
+    main()
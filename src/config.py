@@ -85,6 +85,7 @@ class TransactionColumn:
 class CurrencyFormat:
     thousands_sep: str
     decimal_point: str
+    decimals: int = 2  # number of minor units, i.e., the resolution of amounts
 
     def __post_init__(self):
         if len(self.thousands_sep) > 1:
@@ -97,6 +98,33 @@ class CurrencyFormat:
                 "The decimal separator must be a single character, not '{decimal_point}'"
             )
 
+        if not isinstance(self.decimals, int) or self.decimals < 0:
+            raise ValueError(
+                f"The number of decimals must be a non-negative integer, not {self.decimals}"
+            )
+
+
+def _unchanged(text: str) -> str:
+    return text
+
+
+def _strip_lower(text: str) -> str:
+    return text.strip().lower()
+
+
+def _strip_title(text: str) -> str:
+    return text.strip().title()
+
+
+# How the text of the payee, category and memo columns is written to YNAB
+TEXT_TRANSFORMS: dict[str, Callable[[str], str]] = {
+    "none": _unchanged,
+    "strip": str.strip,
+    "lower": _strip_lower,
+    "title": _strip_title,
+}
+TEXT_COLUMNS = ("payee", "category", "memo")
+
 
 class BankConfig:
     def __init__(
@@ -113,6 +141,10 @@ class BankConfig:
         category_column: (str | None) = None,
         csv_delimiter: (str | None) = None,
         normalizer: (Callable[[str], str] | None) = None,
+        accignore: (list[str] | None) = None,
+        date_order: (str | None) = None,
+        text_transform: (dict[str, str] | None) = None,
+        decimals: int = 2,
     ):
         if name == "":
             raise ValueError(f"The name column name is empty; {name=}")
@@ -132,9 +164,16 @@ class BankConfig:
                 f"The CSV delimiter must be a single character, not '{csv_delimiter}'"
             )
 
+        if date_order not in (None, "ascending", "descending"):
+            raise ValueError(
+                f"The date order must be 'ascending' or 'descending', not '{date_order}'"
+            )
+        self.date_order = date_order  # how the statement's rows are sorted, if known
+
         self.currency_format = CurrencyFormat(
             thousands_sep=thousands_separator,
             decimal_point=decimal_point,
+            decimals=decimals,
         )
         if self.csv_delimiter == self.currency_format.decimal_point == ",":
             warnings.warn(
@@ -142,12 +181,8 @@ class BankConfig:
                 "sure all transaction values are properly quoted",
                 UserWarning,
             )
-        elif csv_delimiter == self.currency_format.thousands_sep == ",":
-            warnings.warn(
-                "Both the delimiter and thousands separator characters are ',' - make "
-                "sure all transaction values are properly quoted",
-                UserWarning,
-            )
+        # The converter re-joins amounts that are split by unquoted thousands
+        # separators, so a delimiter that is also the thousands separator is fine.
 
         self._payee_column = payee_column
         self._memo_column = memo_column
@@ -157,7 +192,28 @@ class BankConfig:
             outflow_columns, inflow_columns
         )
 
-        self.normalizer = lambda x: x
+        accignore = [] if accignore is None else accignore
+        if not isinstance(accignore, list) or not all(
+            isinstance(a, str) for a in accignore
+        ):
+            raise TypeError(f"Expected accignore to be a list of str, not {accignore}")
+        self.accignore = accignore  # payees (e.g. account numbers) to skip
+
+        text_transform = {} if text_transform is None else text_transform
+        for column, transform in text_transform.items():
+            if column not in TEXT_COLUMNS:
+                raise ValueError(
+                    f"Text transforms apply to the {TEXT_COLUMNS} columns, not '{column}'"
+                )
+            elif transform not in TEXT_TRANSFORMS:
+                raise ValueError(
+                    f"The text transform must be one of {list(TEXT_TRANSFORMS)}, not '{transform}'"
+                )
+        # the name of the transform applied to each text column of the output
+        self.text_transform = {column: "strip" for column in TEXT_COLUMNS}
+        self.text_transform.update(text_transform)
+
+        self.normalizer = _unchanged  # a module-level function can be pickled
         if normalizer is not None:
             self.normalizer = normalizer  # string pre-processing function
 
@@ -206,14 +262,17 @@ class BankConfig:
     @classmethod
     def from_dict(cls, toml_config: dict[str, Any]):
         name = toml_config["name"]
+        accignore = toml_config.get("accignore")
 
         currency_config = toml_config["currency_format"]
         thousands_separator = currency_config["thousands_separator"]
         decimal_point = currency_config["decimal_point"]
+        decimals = currency_config.get("decimals", 2)
 
         csv_config: dict[str, Any] = toml_config["csv"]
         date_format = csv_config["date_format"]
         csv_delimiter = csv_config.get("delimiter", ",")
+        date_order = csv_config.get("date_order")
 
         ynab_mapping = toml_config["ynab_mapping"]
         date_column = ynab_mapping["date"]
@@ -223,16 +282,22 @@ class BankConfig:
         memo_column = ynab_mapping.get("memo")
         category_column = ynab_mapping.get("category")
 
+        text_transform = toml_config.get("text_transform")
+
         return cls(
             name=name,
             date_format=date_format,
             csv_delimiter=csv_delimiter,
             thousands_separator=thousands_separator,
             decimal_point=decimal_point,
+            decimals=decimals,
             date_column=date_column,
             outflow_columns=outflow_columns,
             inflow_columns=inflow_columns,
             payee_column=payee_column,
             memo_column=memo_column,
             category_column=category_column,
+            accignore=accignore,
+            date_order=date_order,
+            text_transform=text_transform,
         )
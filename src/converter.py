@@ -1,16 +1,24 @@
 from datetime import datetime
-from decimal import Decimal
+import contextlib
 import functools
+import itertools
 from pathlib import Path
-from typing import NamedTuple, TypeAlias
+from typing import Callable, Iterable, Iterator, NamedTuple, TextIO, TypeAlias
 import csv
 import re
-import warnings
-
-from .config import BankConfig, TransactionFormat, CurrencyFormat
+import sys
+import time
+
+from .config import BankConfig, TransactionFormat, CurrencyFormat, TEXT_TRANSFORMS
+from .dedup import DedupIndex
+from .diagnostics import BAD_FORMAT, EMPTY, OVERFLOW, Diagnostics
+from .incremental import Watermark, WatermarkStore, fingerprint
+from .metrics import ConversionMetrics
+from .profiling import profile as profiled
+from .reader import MappedStatement
+from .sinks import CsvFileSink, Sink, StdoutSink, as_sink
 
 # TODO:
-# * Make accignore a feature of the bank config file
 # * Make this file also function as a script.
 #   - specify a bank and input path + call bank2ynab
 #
@@ -31,8 +39,25 @@ from .config import BankConfig, TransactionFormat, CurrencyFormat
 # Any field can be left blank except the date
 
 
-MaybeDecimal: TypeAlias = Decimal | None
-MaybeDecimalPair: TypeAlias = tuple[MaybeDecimal, MaybeDecimal]
+OUTPUT_CSV = Path("ynabImport.csv")  # default output path, relative to the cwd
+WRITE_BATCH = 1024  # the number of rows handed to the sink at a time
+
+# Amounts are kept as an integer number of minor units (e.g. cents) while
+# converting, and only formatted as a decimal string when written.
+MinorUnits: TypeAlias = int
+MaybeMinorUnits: TypeAlias = MinorUnits | None
+MaybeMinorUnitsPair: TypeAlias = tuple[MaybeMinorUnits, MaybeMinorUnits]
+
+# Rows are plain lists (as read) and tuples (as parsed) rather than dicts.
+# A bank row is indexed with the Columns resolved from the statement's header,
+# and a YNAB row holds date, payee, category, memo, outflow and inflow, in the
+# order of the YnabHeader.
+BankRow: TypeAlias = list[str]
+# Fixes the lines of a statement before they are parsed as csv
+LineFilter: TypeAlias = Callable[[Iterable[str]], Iterable[str]]
+YnabRow: TypeAlias = tuple[
+    str, str | None, str | None, str | None, MinorUnits, MinorUnits
+]
 
 
 class YnabHeader(NamedTuple):
@@ -47,277 +72,858 @@ class YnabHeader(NamedTuple):
 
 
 class TransactionValueParser:
-    _fraction_tag = "decimals"
-
     def __init__(self, config: CurrencyFormat):
-        self._thousands_match = re.compile(fr"{re.escape(config.thousands_sep)}")
-        re_decimal_point = re.escape(config.decimal_point)
-        self._fractional_match = re.compile(
-            fr"{re_decimal_point}(?P<{self._fraction_tag}>[0-9][0-9]?(?![0-9]))"
-        )  # Assume a resolution of tens or hundreds
-
-        # It is optional to have decimals, i.e., "10" instead of "10.00" or "10.0"
-        self._decimal_match = re.compile(r"-?[0-9]+(\.[0-9][0-9]?)?")
-
-    def parse(self, value: str) -> MaybeDecimal:
-        # remove all thousands separators
-        no_thousands_groups = re.sub(self._thousands_match, "", value)
-
-        # replace whatever decimal point was used with a dot
-        replaced_decimal = re.sub(
-            self._fractional_match,
-            "." + fr"\g<{self._fraction_tag}>",
-            no_thousands_groups,
-        )
-
-        # match on a number string that can be converted to a Decimal
-        number_only = re.search(self._decimal_match, replaced_decimal)
+        # remove all thousands separators with a single translate pass
+        self._delete_thousands = str.maketrans("", "", config.thousands_sep)
+
+        # It is optional to have decimals, i.e., "10" instead of "10.00" or "10.0".
+        # Besides the configured decimal point, a dot is always accepted.
+        self._decimals = config.decimals
+        self._scale = 10**config.decimals
+        number = r"(-?[0-9]+)"
+        if self._decimals > 0:
+            digits = rf"([0-9]{{1,{self._decimals}}})"
+            re_decimal_point = re.escape(config.decimal_point)
+            number += rf"(?:\.{digits}|{re_decimal_point}{digits}(?![0-9]))?"
+        self._number_match = re.compile(number)
+
+    def parse(self, value: str) -> MaybeMinorUnits:
+        # match on the first number string and scale it to minor units
+        number_only = self._number_match.search(value.translate(self._delete_thousands))
         if number_only is None:
             return None
 
-        return Decimal(number_only[0])
+        # the last matched group holds the decimals, if there are any
+        last = number_only.lastindex
+        if last == 1:
+            return int(number_only[1]) * self._scale
+
+        return int(number_only[1] + number_only[last].ljust(self._decimals, "0"))
+
+
+class DateParser:
+    """Convert dates in a bank's date format to YNAB's date format
+
+    Statements repeat the same date on many rows, so conversions are memoized
+    in a bounded cache. The date formats used by the bundled bank configs are
+    converted without strptime; any other format falls back to strptime.
+    """
+
+    ynab_format = "%Y/%m/%d"
+
+    _date = r"([1-9][0-9]{3})-([0-9]{1,2})-([0-9]{1,2})"
+    _time = r"([0-9]{1,2}):([0-9]{1,2}):([0-9]{1,2})"
+    _fast_formats = {
+        "%Y-%m-%d": re.compile(_date),
+        "%Y-%m-%d %H:%M:%S": re.compile(rf"{_date} {_time}"),
+    }
+
+    def __init__(self, date_format: str, cache_size: int = 4096):
+        self.date_format = date_format
+        self._fast_match = self._fast_formats.get(date_format)
+        self.parse = functools.lru_cache(maxsize=cache_size)(self._parse)
+
+    def _parse(self, value: str) -> str:
+        if self._fast_match is not None:
+            ynab_date = self._fast_parse(value)
+            if ynab_date is not None:
+                return ynab_date
+
+        # may raise ValueError
+        date = datetime.strptime(value, self.date_format)
+        return date.strftime(self.ynab_format)
+
+    def _fast_parse(self, value: str) -> str | None:
+        """Return None unless the value is a valid date in the fast format"""
+        match = self._fast_match.fullmatch(value)
+        if match is None:
+            return None
+
+        year, month, day, *time = map(int, match.groups())
+        if time and (time[0] > 23 or time[1] > 59 or time[2] > 59):
+            return None
+
+        try:
+            datetime(year, month, day)
+        except ValueError:
+            return None
+
+        return f"{year}/{month:02d}/{day:02d}"
+
+
+class SplitAmountJoiner:
+    """Re-join amounts that an unquoted thousands separator split into fields
+
+    If the thousands separator is also the csv delimiter, then an unquoted
+    amount like 1,234.50 is read as the two fields '1' and '234.50', and the
+    row has more fields than the header. Such fields are joined back into
+    one, from left to right, until the row is as wide as the header.
+    """
+
+    def __init__(self, config: CurrencyFormat):
+        self._sep = config.thousands_sep
+        self._head = re.compile(r"-?[0-9]{1,3}").fullmatch
+        self._group = re.compile(r"[0-9]{3}").fullmatch
+        decimals = ""
+        if config.decimals > 0:
+            decimal_point = re.escape(config.decimal_point)
+            decimals = rf"(?:{decimal_point}[0-9]{{1,{config.decimals}}})?"
+        self._last_group = re.compile(rf"[0-9]{{3}}{decimals}\s*").fullmatch
+
+    def join(self, row: BankRow, width: int) -> BankRow:
+        """Join split amounts, if any, of a row that is wider than ``width``"""
+        excess = len(row) - width
+        joined, i = [], 0
+        while i < len(row):
+            end = i + 1
+            if excess > 0 and self._head(row[i]):
+                # the groups of thousands, up to the one with the decimals
+                limit = min(len(row), i + 1 + excess)
+                while end < limit and self._group(row[end]):
+                    end += 1
+                if end < limit and self._last_group(row[end]):
+                    end += 1
+
+            joined.append(self._sep.join(row[i:end]))
+            excess -= end - i - 1
+            i = end
+
+        return joined
+
+
+class IgnoreMatcher:
+    """Find payees that contain any of the ignored accounts
+
+    The accounts are compiled into a single regular expression shaped like a
+    trie, so each payee is scanned once no matter how many accounts there are.
+    """
+
+    def __init__(self, accounts: Iterable[str]):
+        self.accounts = sorted({a for a in accounts if a})
+
+        trie = {}
+        for account in self.accounts:
+            node = trie
+            for char in account:
+                node = node.setdefault(char, {})
+            node[""] = {}  # end of an account
+
+        self._search = re.compile(_trie_pattern(trie)).search if trie else None
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def matches(self, payee: str) -> bool:
+        return self._search is not None and self._search(payee) is not None
+
+
+def _trie_pattern(trie: dict[str, dict]) -> str:
+    if "" in trie:
+        return ""  # a shorter account is already contained in the payee
+
+    alternatives = [
+        re.escape(char) + _trie_pattern(node) for char, node in trie.items()
+    ]
+    if len(alternatives) == 1:
+        return alternatives[0]
+
+    return "(?:" + "|".join(alternatives) + ")"
+
+
+class RowPlan(NamedTuple):
+    """Per-bank column lookups, resolved once per Converter
+
+    Reading the BankConfig column properties re-runs the normalizer (and
+    allocates new TransactionColumns) on every access, so the per-row loop
+    only uses the normalized keys and bound parsers held by the plan.
+    """
+
+    date_key: str
+    payee_key: str | None
+    category_key: str | None
+    memo_key: str | None
+    transaction_columns: tuple[tuple[str, Callable[[str], MaybeMinorUnitsPair]], ...]
+    output_fields: tuple[str, ...]
+    # applied to the text of the payee, category and memo cells when parsed
+    payee_transform: Callable[[str], str]
+    category_transform: Callable[[str], str]
+    memo_transform: Callable[[str], str]
+
+
+class Columns(NamedTuple):
+    """Indices of the RowPlan's columns in a statement's header"""
+
+    date: int
+    payee: int | None
+    category: int | None
+    memo: int | None
+    transactions: tuple[tuple[int, Callable[[str], MaybeMinorUnitsPair]], ...]
+    width: int  # the number of columns in the header
+
+
+class ConversionCancelled(Exception):
+    """Raised by a conversion once it has been cancelled"""
+
+
+class Progress(NamedTuple):
+    bytes_read: int
+    bytes_total: int  # the size of the statement, or 0 if it's not known
+    rows_read: int
+    rows_parsed: int
 
 
 class Converter:
-    def __init__(self, config: BankConfig):
+    def __init__(
+        self,
+        config: BankConfig,
+        watermark: Watermark | None = None,
+        dedup: DedupIndex | None = None,
+        diagnostics: Diagnostics | None = None,
+        line_filter: LineFilter | None = None,
+        encoding: str = "utf-8",
+    ):
         self.ynab_header = YnabHeader()
         self.config = config
-        self.config.normalizer = normalize
+        # The config may be shared (see registry.py), so its normalizer is
+        # left as it is and the column names are normalized here as well
+        self.normalizer = normalize
         self.transaction_parser = TransactionValueParser(config.currency_format)
+        self.date_parser = DateParser(config.date_format)
+        self.plan = self._compile_row_plan()
+        self.columns: Columns | None = None  # resolved once the header is read
+
+        # Rows stream through the pipeline, so only the counts are kept
+        self.metrics = ConversionMetrics()
+        # Bad rows are reported in a summary once the conversion is done
+        self.diagnostics = Diagnostics() if diagnostics is None else diagnostics
+
+        # Only convert transactions newer than the watermark, if there is one.
+        # The watermark is moved forward once all rows have been converted.
+        self.watermark = watermark
+
+        # Drop transactions found in the index of earlier conversions, if any.
+        # The index is committed once the output has been written.
+        self.dedup = dedup
+
+        # Lines are passed through the filter, if any, as they are read. For
+        # example, fix_revolut's NumberQuoter.quote_lines quotes the amounts
+        # of Revolut v1 statements without writing a fixed copy first.
+        self.line_filter = line_filter
+        self.encoding = encoding  # of the statement, e.g. as detected from it
+        # where the stats of the stages are printed, sys.stdout if None
+        self.messages: TextIO | None = None
+
+        # The conversion can be followed and cancelled from another thread
+        self.cancelled = False
+        self._statement: MappedStatement | None = None  # while it is read
+
+    def _compile_row_plan(self) -> RowPlan:
+        def normalized(key: str | None) -> str | None:
+            return None if key is None else self.normalizer(key)
+
+        transaction_columns = tuple(
+            (
+                normalized(column.header_key),
+                self._transaction_parser(column.transaction_format),
+            )
+            for column in self.config.transaction_columns
+        )
+
+        return RowPlan(
+            date_key=normalized(self.config.date_column),
+            payee_key=normalized(self.config.payee_column),
+            category_key=normalized(self.config.category_column),
+            memo_key=normalized(self.config.memo_column),
+            transaction_columns=transaction_columns,
+            output_fields=tuple(self.ynab_header),
+            payee_transform=TEXT_TRANSFORMS[self.config.text_transform["payee"]],
+            category_transform=TEXT_TRANSFORMS[self.config.text_transform["category"]],
+            memo_transform=TEXT_TRANSFORMS[self.config.text_transform["memo"]],
+        )
+
+    def _resolve_columns(self, header: list[str], name: str) -> Columns:
+        indices = {key: i for i, key in enumerate(header)}  # the last one wins
+
+        def required(key: str) -> int:
+            if key not in indices:
+                raise ValueError(f"file {name}: column '{key}' not found in {header=}")
+            return indices[key]
+
+        plan = self.plan  # rename
+        return Columns(
+            date=required(plan.date_key),
+            payee=indices.get(plan.payee_key),
+            category=indices.get(plan.category_key),
+            memo=indices.get(plan.memo_key),
+            transactions=tuple(
+                (required(key), parser) for key, parser in plan.transaction_columns
+            ),
+            width=len(header),
+        )
+
+    @property
+    def numEmptyRows(self) -> int:
+        return self.metrics.rows["empty"]
+
+    @property
+    def numIgnoredRows(self) -> int:
+        return self.metrics.rows["ignored"]
+
+    @property
+    def numReadRows(self) -> int:
+        return self.metrics.rows["read"]
+
+    @property
+    def numParsedRows(self) -> int:
+        return self.metrics.rows["parsed"]
+
+    def cancel(self):
+        """Stop the conversion before the next row is read
+
+        The conversion raises ConversionCancelled, and nothing is written.
+        """
+        self.cancelled = True
 
-        self.ignoredRows = []
-        self.readRows = []
-        self.parsedRows = []
-        self.numEmptyRows = 0
+    def progress(self) -> Progress:
+        bytes_read, bytes_total = self.metrics.bytes_read, 0
+        if (statement := self._statement) is not None:
+            bytes_read, bytes_total = statement.offset, len(statement)
 
-    def convert(self, statement_csv: Path, toIgnore=None) -> bool:
+        return Progress(bytes_read, bytes_total, self.numReadRows, self.numParsedRows)
+
+    def counts(self) -> tuple[int, int, int, int]:
+        """Return the number of empty, ignored, read and parsed rows"""
+        return (
+            self.numEmptyRows,
+            self.numIgnoredRows,
+            self.numReadRows,
+            self.numParsedRows,
+        )
+
+    def convert(
+        self, statement_csv: Path, toIgnore=None, sink: Sink | Path = OUTPUT_CSV
+    ) -> bool:
         toIgnore = [] if toIgnore is None else toIgnore
 
-        # Attempt to parse input file to a YNAB-formatted csv file
+        # Attempt to parse input file to a YNAB-formatted csv file.
+        # The stages are chained generators: rows are read, parsed and
+        # written one at a time as writeOutput consumes them.
         # May raise OSError
         bankData = self.readInput(statement_csv, toIgnore)
+        if self.watermark is not None:
+            bankData = self.skipOlder(bankData)
         parsed = self.parseRows(bankData)
-
-        return self.writeOutput(parsed)
-
-    def readInput(self, statement_csv: Path, toIgnore) -> list[dict[str, str]]:
-        with statement_csv.open(encoding="utf-8-sig", newline="") as f:
-            restkey = "overflow"
-            reader = csv.DictReader(
-                f,
-                delimiter=self.config.csv_delimiter,
-                restkey=restkey,
-                skipinitialspace=True,  # important since qouting won't work if there is leading whitespace
-            )
-            reader.fieldnames = [
-                self.config.normalizer(name) for name in reader.fieldnames
-            ]
+        if self.watermark is not None:
+            parsed = self.skipConverted(parsed)
+        if self.dedup is not None:
+            parsed = self.skipDuplicates(parsed)
+
+        try:
+            hasWritten = self.writeOutput(parsed, sink)
+        except BaseException:
+            # the rows added to the index were never written
+            if self.dedup is not None:
+                self.dedup.rollback()
+            raise
+        finally:
+            self.diagnostics.close()
+        if self.dedup is not None:
+            self.dedup.commit()
+
+        return hasWritten
+
+    def readInput(self, statement_csv: Path, toIgnore) -> Iterator[BankRow]:
+        with MappedStatement(statement_csv, self.encoding) as statement:
+            self._statement = statement
             try:
-                for raw_row in reader:
-                    if overflowing_columns := raw_row.get(restkey):
-                        msg = f"Exccess columns found: {overflowing_columns=}"
-                        warnings.warn(msg, RuntimeWarning)
-                        del raw_row[restkey]
-
-                    row = {k: self.config.normalizer(v) for k, v in raw_row.items()}
-                    is_empty = all((len(v) == 0 for v in row.values()))
-                    if is_empty:
-                        warnings.warn(
-                            f"\n\tSkipping empty row {reader.line_num}: {row}",
-                            RuntimeWarning,
-                        )
-                        self.numEmptyRows += 1
-                    else:
-                        if (payee := row.get(self.config.payee_column)) and len(
-                            toIgnore
-                        ) > 0:
-                            for i in toIgnore:
-                                if i not in payee:
-                                    self.readRows.append(row)
-                                else:
-                                    self.ignoredRows.append(row)
-                        else:
-                            self.readRows.append(row)
-            except csv.Error as e:
-                raise OSError(f"file {str(statement_csv)}\n line {row}: {e}")
+                lines = statement.lines()
+                if self.line_filter is not None:
+                    lines = self.line_filter(lines)
+                yield from self.readCsv(lines, toIgnore, name=str(statement_csv))
             finally:
-                print(
-                    "{0}/{1} line(s) successfully read "
-                    "(ignored {2} blank line(s) and "
-                    "{3} transactions found in accignore).".format(
-                        len(self.readRows),
-                        reader.line_num - 1,
-                        self.numEmptyRows,
-                        len(self.ignoredRows),
-                    )
-                )
-
-        return self.readRows
-
-    def parseRows(self, bankRows):
+                self.metrics.bytes_read += statement.offset
+                self._statement = None
+
+    def readCsv(
+        self,
+        f: TextIO | Iterable[str],
+        toIgnore,
+        name: str = "<stream>",
+        line_offset: int = 0,
+    ) -> Iterator[BankRow]:
+        """Read rows from an open csv-file (or its lines), starting with the header
+
+        The columns of the rows are resolved from the header (see
+        ``self.columns``) before the first row is yielded. Only the header
+        and the payee (to match it with the ignored accounts) are normalized;
+        the cells are yielded as they are read. The ``line_offset`` is added
+        to the line numbers of the rows that are reported, e.g. if the rows
+        are a chunk from further down the statement.
+        """
+        ignored = IgnoreMatcher(
+            self.normalizer(account) for account in [*self.config.accignore, *toIgnore]
+        )
+
+        reader = csv.reader(
+            f,
+            delimiter=self.config.csv_delimiter,
+            skipinitialspace=True,  # important since qouting won't work if there is leading whitespace
+        )
+        normalizer = self.normalizer
+        try:
+            header = next(reader, None)
+        except csv.Error as e:
+            raise OSError(f"file {name}\n line {reader.line_num}: {e}")
+        if header is None:
+            return  # an empty file has nothing to convert
+        self.columns = columns = self._resolve_columns(
+            [normalizer(key) for key in header], name
+        )
+        width, payee_index = columns.width, columns.payee
+        currency_format = self.config.currency_format
+        joiner = None
+        if currency_format.thousands_sep == self.config.csv_delimiter:
+            joiner = SplitAmountJoiner(currency_format)
+
+        rows, seconds = self.metrics.rows, self.metrics.seconds
+        clock = time.perf_counter
+        read_s, tokenize_s, ignore_s = 0.0, 0.0, 0.0
+        try:
+            t0 = clock()
+            for raw_row in reader:
+                t1 = clock()
+                if self.cancelled:
+                    raise ConversionCancelled(f"The conversion of {name} was cancelled")
+                elif len(raw_row) == 0:
+                    t0 = clock()
+                    continue  # a blank line, which isn't a row at all
+                elif len(raw_row) > width:
+                    if joiner is not None:
+                        raw_row = joiner.join(raw_row, width)
+                        rows["rejoined"] += len(raw_row) == width
+                    if len(raw_row) > width:
+                        self.diagnostics.report(
+                            OVERFLOW,
+                            raw_row,
+                            reader.line_num + line_offset,
+                            f"{len(raw_row) - width} more than the header",
+                        )
+                if len(raw_row) < width:
+                    raw_row += [""] * (width - len(raw_row))
+
+                row = raw_row
+                is_empty = not "".join(row).strip()
+                t2 = clock()
+
+                keep = False
+                if is_empty:
+                    self.diagnostics.report(EMPTY, row, reader.line_num + line_offset)
+                    rows["empty"] += 1
+                elif payee_index is not None and ignored.matches(
+                    normalizer(row[payee_index])
+                ):
+                    rows["ignored"] += 1
+                else:
+                    rows["read"] += 1
+                    keep = True
+                t3 = clock()
+
+                read_s += t1 - t0
+                tokenize_s += t2 - t1
+                ignore_s += t3 - t2
+                if keep:
+                    yield row
+                t0 = clock()
+        except csv.Error as e:
+            self.metrics.errors["csv.Error"] += 1
+            line = reader.line_num + line_offset
+            raise OSError(f"file {name}\n line {line}: {e}")
+        finally:
+            seconds["read"] += read_s
+            seconds["tokenize"] += tokenize_s
+            seconds["ignore"] += ignore_s
+            if (buffer := getattr(f, "buffer", None)) and not f.closed:
+                self.metrics.bytes_read += buffer.tell()
+
+            print(
+                "{0}/{1} line(s) successfully read "
+                "(ignored {2} blank line(s) and "
+                "{3} transactions found in accignore).".format(
+                    self.numReadRows,
+                    reader.line_num - 1,
+                    self.numEmptyRows,
+                    self.numIgnoredRows,
+                ),
+                file=self.messages,
+            )
+
+    def parseRows(self, bankRows: Iterable[BankRow]) -> Iterator[YnabRow]:
         for row in bankRows:
             try:
-                self.parsedRows.append(self.parseRow(row))
+                parsed = self.parseRow(row)
             except (ValueError, TypeError) as e:
-                msg = f"\n\t{row}\n\tError: {e}"
-                warnings.warn(badFormatWarn(msg), RuntimeWarning)
-
-        print(f"{len(self.parsedRows)}/{len(bankRows)} line(s) successfully parsed ")
+                self.metrics.errors[type(e).__name__] += 1
+                self.diagnostics.report(BAD_FORMAT, row, reason=f"{e}")
+            else:
+                self.metrics.rows["parsed"] += 1
+                yield parsed
+
+        print(
+            f"{self.numParsedRows}/{self.numReadRows} line(s) successfully parsed ",
+            file=self.messages,
+        )
 
-        return self.parsedRows
+    def skipOlder(self, bankRows: Iterable[BankRow]) -> Iterator[BankRow]:
+        """Skip rows dated before the watermark without parsing them
 
-    def _parse_amount(self, amount: str) -> MaybeDecimalPair:
-        decimal = self.transaction_parser.parse(amount)
-        if decimal is None:
+        If the bank lists its transactions newest first, then the rest of the
+        statement is not read once the first row before the watermark is found.
+        """
+        watermark_date = self.watermark.date
+        newest_first = self.config.date_order == "descending"
+        for row in bankRows:
+            try:
+                date = self.date_parser.parse(row[self.columns.date].strip())
+                is_older = date < watermark_date
+            except ValueError:
+                is_older = False  # let parseRows report the bad row
+
+            if not is_older:
+                yield row
+            elif newest_first:
+                self.metrics.rows["skipped"] += 1
+                return
+            else:
+                self.metrics.rows["skipped"] += 1
+
+    def skipConverted(self, parsedRows: Iterable[YnabRow]) -> Iterator[YnabRow]:
+        """Skip rows that were converted on the watermark date
+
+        Identical transactions are told apart by counting their occurrences.
+        Skipped rows are not counted as parsed.
+        """
+        old = self.watermark
+        remaining = dict(old.fingerprints)  # occurrences left to skip
+        newest_date, newest = old.date, dict(old.fingerprints)
+        rows = self.metrics.rows
+        for row in parsedRows:
+            date = row[0]
+            if date < old.date:
+                rows["parsed"] -= 1
+                rows["skipped"] += 1
+                continue
+
+            fp = fingerprint(row)
+            if date == old.date and remaining.get(fp, 0) > 0:
+                remaining[fp] -= 1
+                rows["parsed"] -= 1
+                rows["skipped"] += 1
+                continue
+
+            if date > newest_date:
+                newest_date, newest = date, {}
+            if date == newest_date:
+                newest[fp] = newest.get(fp, 0) + 1
+
+            yield row
+
+        print(
+            f"{rows['skipped']} already converted line(s) skipped.", file=self.messages
+        )
+        self.watermark = Watermark(newest_date, newest)
+
+    def skipDuplicates(self, parsedRows: Iterable[YnabRow]) -> Iterator[YnabRow]:
+        """Skip rows found in the index of earlier conversions
+
+        Skipped rows are not counted as parsed.
+        """
+        decimals = self.config.currency_format.decimals
+        to_str = lambda v: "" if v is None else v
+        rows, seconds = self.metrics.rows, self.metrics.seconds
+        clock = time.perf_counter
+        self.dedup.new_statement()
+        for row in parsedRows:
+            t0 = clock()
+            date, payee, _, memo, outflow, inflow = row
+            is_new = self.dedup.is_new(
+                date,
+                to_str(payee),
+                to_str(memo),
+                minor_units_to_str(outflow, decimals),
+                minor_units_to_str(inflow, decimals),
+            )
+            seconds["dedup"] += clock() - t0
+            if is_new:
+                yield row
+            else:
+                rows["parsed"] -= 1
+                rows["duplicate"] += 1
+
+        print(f"{rows['duplicate']} duplicate line(s) skipped.", file=self.messages)
+
+    def _parse_amount(self, amount: str) -> MaybeMinorUnitsPair:
+        units = self.transaction_parser.parse(amount)
+        if units is None:
             return None, None
 
-        outflow = abs(decimal) if decimal.is_signed() else None
-        inflow = decimal if not decimal.is_signed() else None
+        if units < 0:
+            return -units, None
 
-        return outflow, inflow
+        return None, units
 
-    def _parse_outflow(self, outflow: str) -> MaybeDecimalPair:
-        decimal = self.transaction_parser.parse(outflow)
-        if decimal is None:
+    def _parse_outflow(self, outflow: str) -> MaybeMinorUnitsPair:
+        units = self.transaction_parser.parse(outflow)
+        if units is None:
             return None, None
 
-        if decimal.is_signed() and not decimal.is_zero():
-            raise RuntimeError("Found a negative outflow", decimal)
+        if units < 0:
+            raise RuntimeError("Found a negative outflow", outflow)
 
-        return decimal, None
+        return units, None
 
-    def _parse_inflow(self, inflow: str) -> MaybeDecimalPair:
-        decimal = self.transaction_parser.parse(inflow)
-        if decimal is None:
+    def _parse_inflow(self, inflow: str) -> MaybeMinorUnitsPair:
+        units = self.transaction_parser.parse(inflow)
+        if units is None:
             return None, None
 
-        if decimal.is_signed() and not decimal.is_zero():
-            raise RuntimeError("Found a negative inflow", decimal)
+        if units < 0:
+            raise RuntimeError("Found a negative inflow", inflow)
 
-        return None, decimal
+        return None, units
 
-    def parseTransactionValues(self, bankline) -> MaybeDecimalPair:
-        parsed_values = []
-        for column in self.config.transaction_columns:
-            v = self.parse_column_value(
-                bankline[column.header_key], column.transaction_format
-            )
-            parsed_values.append(v)
-
-        none_filter = functools.partial(filter, lambda v: v is not None)
-        net_out, net_in = map(sum, map(none_filter, zip(*parsed_values, strict=True)))
+    def parseTransactionValues(self, bankline: BankRow) -> MaybeMinorUnitsPair:
+        net_out, net_in = 0, 0
+        for index, transaction_parser in self.columns.transactions:
+            outflow, inflow = transaction_parser(bankline[index])
+            if outflow is not None:
+                net_out += outflow
+            if inflow is not None:
+                net_in += inflow
 
         return net_out, net_in
 
     def parse_column_value(
         self, value: str, format: TransactionFormat
-    ) -> MaybeDecimalPair:
+    ) -> MaybeMinorUnitsPair:
+        return self._transaction_parser(format)(value)
+
+    def _transaction_parser(
+        self, format: TransactionFormat
+    ) -> Callable[[str], MaybeMinorUnitsPair]:
         match format:
             case TransactionFormat.AMOUNT:
-                transaction_parser = self._parse_amount
+                return self._parse_amount
             case TransactionFormat.OUTFLOW:
-                transaction_parser = self._parse_outflow
+                return self._parse_outflow
             case TransactionFormat.INFLOW:
-                transaction_parser = self._parse_inflow
+                return self._parse_inflow
             case _:
-                raise RuntimeError(
-                    f"{self.config.transaction_format=} is not a valid TransactionFormat"
-                )
-
-        if transaction_parser is None:
-            raise RuntimeError(
-                f"expected {TransactionFormat.AMOUNT} or"
-                f" {TransactionFormat.OUT_IN} as transaction"
-                f" format, got {self.csvTrasactionFormat=}"
-            )
+                raise RuntimeError(f"{format=} is not a valid TransactionFormat")
 
-        return transaction_parser(value)
-
-    def parseRow(self, bankline: dict[str, str]):
-        # must have outflow/inflow columns in YNAB4
-        outflow, inflow = decimal_pair_to_str(self.parseTransactionValues(bankline))
-
-        bank_date = bankline[self.config.date_column]
-        date = datetime.strptime(
-            bank_date, self.config.date_format
-        )  # convert to datetime
-        date = date.strftime("%Y/%m/%d")  # YNAB4 desired format
-
-        yh = self.ynab_header  # rename
-        ynab_row = dict().fromkeys(
-            list(self.ynab_header)
-        )  # assert same ordering of keys as self.ynab_header
-        ynab_row[yh.date] = date
-        ynab_row[yh.outflow] = outflow
-        ynab_row[yh.inflow] = inflow
-        ynab_row[yh.payee] = bankline.get(self.config.payee_column)
-        ynab_row[yh.category] = bankline.get(self.config.category_column)
-        ynab_row[yh.memo] = bankline.get(self.config.memo_column)
-
-        return ynab_row
-
-    def writeOutput(self, parsedRows) -> bool:
-        hasWritten = False
-
-        if parsedRows == None or len(parsedRows) == 0:
-            return hasWritten
-
-        with open("ynabImport.csv", "w", encoding="utf-8", newline="") as outputFile:
-            writer = csv.DictWriter(outputFile, list(self.ynab_header))
-            try:
-                writer.writeheader()
-                writer.writerows(parsedRows)
-                hasWritten = True
-                print("YNAB csv-file successfully written.")
-            except csv.Error as e:
-                raise OSError(f"File {outputFile}, line {writer.line_num}: {e}")
-            finally:
-                return hasWritten
+    def parseRow(self, bankline: BankRow) -> YnabRow:
+        plan, columns = self.plan, self.columns  # rename
 
+        seconds = self.metrics.seconds
+        t0 = time.perf_counter()
 
-def decimal_pair_to_str(dp: MaybeDecimalPair) -> tuple[str | None]:
-    to_str = lambda d: str(d) if d is not None else None
-    return tuple(to_str(d) for d in dp)
+        # must have outflow/inflow columns in YNAB4
+        outflow, inflow = self.parseTransactionValues(bankline)
+        t1 = time.perf_counter()
+
+        date = self.date_parser.parse(bankline[columns.date].strip())  # YNAB4 format
+        t2 = time.perf_counter()
+
+        seconds["amounts"] += t1 - t0
+        seconds["dates"] += t2 - t1
+
+        return (
+            date,
+            (
+                None
+                if columns.payee is None
+                else plan.payee_transform(bankline[columns.payee])
+            ),
+            (
+                None
+                if columns.category is None
+                else plan.category_transform(bankline[columns.category])
+            ),
+            (
+                None
+                if columns.memo is None
+                else plan.memo_transform(bankline[columns.memo])
+            ),
+            outflow,
+            inflow,
+        )
 
+    def formatRow(self, ynab_row: YnabRow) -> tuple[str | None, ...]:
+        """Format the amounts of a parsed row as YNAB's decimal strings"""
+        decimals = self.config.currency_format.decimals
+        *text, outflow, inflow = ynab_row
+        return (
+            *text,
+            minor_units_to_str(outflow, decimals),
+            minor_units_to_str(inflow, decimals),
+        )
 
-def readIgnore():
+    def writeOutput(
+        self, parsedRows: Iterable[YnabRow], sink: Sink | Path = OUTPUT_CSV
+    ) -> bool:
+        """Write the rows to a sink, or to a csv-file if given a path"""
+        # Writing drives the upstream stages, so the time spent writing is
+        # what remains after subtracting the time they took.
+        seconds = self.metrics.seconds
+        upstream = lambda: sum(v for k, v in seconds.items() if k != "write")
+        start, upstream_start = time.perf_counter(), upstream()
+        sink, messages = as_sink(sink), self.messages
+        if isinstance(sink, StdoutSink) and messages is None:
+            # the stages print their stats while the rows are written, which
+            # would end up among the rows
+            self.messages = sys.stderr
+        try:
+            return self._write(parsedRows, sink)
+        finally:
+            self.messages = messages
+            elapsed = time.perf_counter() - start
+            seconds["write"] += elapsed - (upstream() - upstream_start)
+
+    def _write(self, parsedRows: Iterable[YnabRow], sink: Sink) -> bool:
+        rows = map(self.formatRow, parsedRows)
+
+        # Pull the first row before opening the sink so that nothing is
+        # written when there is nothing to convert
+        first_row = next(rows, None)
+        if first_row is None:
+            return False
+
+        # The sink is aborted if the conversion fails or is cancelled
+        # halfway, which leaves no partial output behind (see sinks.py).
+        sink.open(self.plan.output_fields)
+        try:
+            batch = [first_row, *itertools.islice(rows, WRITE_BATCH - 1)]
+            while batch:
+                sink.write(batch)
+                batch = list(itertools.islice(rows, WRITE_BATCH))
+            sink.close()
+        except csv.Error as e:
+            sink.abort()
+            self.metrics.errors["csv.Error"] += 1
+            raise OSError(f"{sink}: {e}")
+        except BaseException:
+            sink.abort()
+            raise
+
+        print("YNAB csv-file successfully written.", file=self.messages)
+        return True
+
+
+def minor_units_to_str(units: MinorUnits, decimals: int) -> str:
+    if decimals == 0:
+        return str(units)
+
+    whole, fraction = divmod(abs(units), 10**decimals)
+    sign = "-" if units < 0 else ""
+    return f"{sign}{whole}.{fraction:0{decimals}d}"
+
+
+def readIgnore(messages: TextIO | None = None):
+    """Read the ignored accounts, printing them to ``messages`` (or stdout)"""
     accounts = []
     try:
         with open("accignore.txt", encoding="utf-8", newline="") as ignored:
             for account in ignored:
-                accounts.append(account)
+                if account := account.strip():
+                    accounts.append(account)
         msg = f"Ignoring transactions from account(s): {accounts}"
     except OSError:
         msg = "Parsing all transactions..."
-    print(msg)
+    print(msg, file=messages)
     return accounts
 
 
-def badFormatWarn(entry):
-    return f"\n\tIncorrectly formated row:{entry}\n\t Skipping..."
-
-
 def normalize(value: str) -> str:
     return value.strip().lower()
 
 
-def bank2ynab(bank: BankConfig, statement_csv: Path):
-    """Perform the conversion from a bank csv-file to YNAB's csv format"""
-    converter = Converter(config=bank)
+def bank2ynab(
+    bank: BankConfig,
+    statement_csv: Path,
+    sink: Sink | Path = OUTPUT_CSV,
+    toIgnore: list[str] | None = None,
+    watermarks: WatermarkStore | None = None,
+    account: str = "",
+    dedup: DedupIndex | None = None,
+    metrics_file: Path | None = None,
+    profile: str | None = None,
+    rejects_csv: Path | None = None,
+    line_filter: LineFilter | None = None,
+    encoding: str = "utf-8",
+):
+    """Perform the conversion from a bank csv-file to YNAB's csv format
+
+    The rows are written to the ``sink`` (see sinks.py), or to a csv-file if
+    it's a path (gzip-compressed if it ends with '.gz').
+
+    If ``watermarks`` are given, then only transactions newer than the
+    watermark of the bank's ``account`` are converted, and the watermark is
+    saved if the conversion succeeds. If a ``dedup`` index is given, then
+    transactions that are already in the index are not converted. If a
+    ``metrics_file`` is given, then the timings and counters of the
+    conversion are written to it (see ConversionMetrics.write). If a
+    ``profile`` profiler is given ('cprofile' or 'pyinstrument'), then the
+    conversion is profiled, and the profile and a summary of it are written
+    next to the output file, or in the cwd for other sinks (see
+    profiling.profile). If a ``rejects_csv`` is given, then the rows that
+    could not be converted are written to it. If a ``line_filter`` is given,
+    then the statement's lines are passed through it before they are
+    parsed. The statement is decoded with ``encoding``.
+    """
+    sink = as_sink(sink)
+    watermark = None if watermarks is None else watermarks.get(bank.name, account)
+    converter = Converter(
+        config=bank,
+        watermark=watermark,
+        dedup=dedup,
+        diagnostics=Diagnostics(rejects_csv=rejects_csv),
+        line_filter=line_filter,
+        encoding=encoding,
+    )
 
-    # Check for accignore.txt and obtain a list of ignored accounts.
-    try:
-        ignoredAccounts = readIgnore()
-    except OSError:
-        ignoredAccounts = []  # It's okay to not have it.
+    # Check for accignore.txt and obtain a list of ignored accounts,
+    # unless the caller already has one.
+    if toIgnore is not None:
+        ignoredAccounts = toIgnore
+    else:
+        try:
+            # the rows written to stdout shouldn't be mixed with messages
+            ignoredAccounts = readIgnore(
+                sys.stderr if isinstance(sink, StdoutSink) else None
+            )
+        except OSError:
+            ignoredAccounts = []  # It's okay to not have it.
 
     # Do the conversion:
     # fetch file, attempt parsing, write output, and return results.
-    hasConverted = converter.convert(statement_csv, ignoredAccounts)
-    return (
-        hasConverted,
-        converter.numEmptyRows,
-        len(converter.ignoredRows),
-        len(converter.readRows),
-        len(converter.parsedRows),
+    profiling = (
+        contextlib.nullcontext()
+        if profile is None
+        else profiled(_profile_file(sink), profile)
     )
+    try:
+        with profiling:
+            hasConverted = converter.convert(statement_csv, ignoredAccounts, sink)
+    finally:
+        if metrics_file is not None:
+            converter.metrics.write(metrics_file)
+    if hasConverted and watermarks is not None:
+        watermarks.set(bank.name, account, converter.watermark)
+        watermarks.save()
+
+    return (hasConverted, *converter.counts())
+
+
+def _profile_file(sink: Sink) -> Path:
+    if isinstance(sink, CsvFileSink):
+        return sink.path.with_suffix(".prof")
+    return OUTPUT_CSV.with_suffix(".prof")
@@ -0,0 +1,119 @@
+"""An on-disk index of converted transactions, used to drop duplicates.
+
+Transactions are identified by a 64-bit hash of their date, payee, memo,
+outflow, inflow and occurrence index. The occurrence index tells identical
+transactions within a statement apart: the second identical transaction in
+a statement is only a duplicate if an earlier statement also had (at least)
+two of them.
+
+The hashes are stored in an SQLite table keyed on the hash, so looking up a
+transaction does not require loading the history into memory.
+"""
+
+import csv
+import hashlib
+import os
+from pathlib import Path
+import sqlite3
+import tempfile
+
+DEDUP_DB = Path("bank2ynab_dedup.sqlite3")
+
+
+def _transaction_hash(values: tuple[str, ...], occurrence: int) -> int:
+    key = "\x1f".join((*values, str(occurrence)))
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)  # fits an SQLite INTEGER
+
+
+class DedupIndex:
+    """Hashes of all converted transactions, stored in an SQLite database
+
+    Changes are only persisted by ``commit``, which should be called once
+    the converted transactions have been written.
+    """
+
+    def __init__(self, path: Path = DEDUP_DB):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen "
+            "(hash INTEGER PRIMARY KEY, statement INTEGER NOT NULL)"
+        )
+        (last,) = self._db.execute("SELECT max(statement) FROM seen").fetchone()
+        self._statement = 0 if last is None else last
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def new_statement(self):
+        """Start counting occurrences for a new statement"""
+        self._statement += 1
+
+    def is_new(
+        self, date: str, payee: str, memo: str, outflow: str, inflow: str
+    ) -> bool:
+        """Check if a transaction is new and add it to the index"""
+        values = (date, payee, memo, outflow, inflow)
+        occurrence = 0
+        while True:
+            h = _transaction_hash(values, occurrence)
+            found = self._db.execute(
+                "SELECT statement FROM seen WHERE hash = ?", (h,)
+            ).fetchone()
+            if found is None:
+                self._db.execute("INSERT INTO seen VALUES (?, ?)", (h, self._statement))
+                return True
+            elif found[0] != self._statement:
+                # seen in an earlier statement; claim it for this statement so
+                # that the next identical transaction gets the next occurrence
+                self._db.execute(
+                    "UPDATE seen SET statement = ? WHERE hash = ?", (self._statement, h)
+                )
+                return False
+
+            occurrence += 1
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT count(*) FROM seen").fetchone()[0]
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def close(self):
+        """Close the database, discarding uncommitted changes"""
+        self._db.close()
+
+
+def dedup_csv(index: DedupIndex, ynab_csv: Path) -> int:
+    """Drop the transactions of a YNAB csv-file that are already in the index
+
+    :returns: the number of dropped transactions
+    """
+    index.new_statement()
+    dropped = 0
+    fd, tmp_path = tempfile.mkstemp(dir=ynab_csv.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as out, ynab_csv.open(
+            encoding="utf-8", newline=""
+        ) as f:
+            reader, writer = csv.reader(f), csv.writer(out)
+            writer.writerow(next(reader))  # header
+            for row in reader:
+                date, payee, _, memo, outflow, inflow = row
+                if index.is_new(date, payee, memo, outflow, inflow):
+                    writer.writerow(row)
+                else:
+                    dropped += 1
+        os.replace(tmp_path, ynab_csv)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return dropped
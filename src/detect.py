@@ -0,0 +1,168 @@
+"""Detect the bank of a statement from its header.
+
+Only the first few KB of a statement are read, and decoded with the first
+encoding that fits them (which the statement should then be converted
+with). The header is split with each delimiter used by the bank configs,
+normalized and matched against the columns of every config. A
+config matches if the header has all of its date and transaction columns,
+and the config that finds the most of its columns wins. Ties are broken by
+whether the date of the first row fits the config's date format.
+
+The columns of the configs are indexed once per BankDetector, so detecting
+the bank of a statement costs one small read and a few set operations.
+"""
+
+import codecs
+import csv
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+from .config import BankConfig
+from .converter import normalize
+from .reader import line_ending
+from .registry import bank_index, configs_stamp, load_config
+
+HEAD_BYTES = 8192  # enough for the header and the first row
+ENCODINGS = ("utf-8", "cp1252", "latin-1")  # latin-1 decodes anything
+
+
+class Signature(NamedTuple):
+    """The normalized columns of a bank config"""
+
+    config_path: Path
+    config: BankConfig
+    date_key: str
+    required: frozenset[str]  # the date and transaction columns
+    optional: frozenset[str]  # the payee, category and memo columns
+
+
+class Detection(NamedTuple):
+    config_path: Path
+    config: BankConfig
+    encoding: str
+    delimiter: str
+
+
+class BankDetector:
+    def __init__(self, bank_dir: Path):
+        self.stamp = configs_stamp(bank_dir)  # of the configs as they're indexed
+        self.signatures: list[Signature] = []
+        for bank in bank_index(bank_dir):
+            try:
+                config = load_config(bank.path)
+            except (KeyError, OSError, ValueError, TypeError):
+                continue  # a broken config can't be converted with anyway
+
+            # normalize is idempotent, whichever normalizer the config has
+            date_key = normalize(config.date_column)
+            transaction_keys = {
+                normalize(tc.header_key) for tc in config.transaction_columns
+            }
+            optional = {
+                normalize(column)
+                for column in (
+                    config.payee_column,
+                    config.category_column,
+                    config.memo_column,
+                )
+                if column is not None
+            }
+            self.signatures.append(
+                Signature(
+                    config_path=bank.path,
+                    config=config,
+                    date_key=date_key,
+                    required=frozenset({date_key, *transaction_keys}),
+                    optional=frozenset(optional),
+                )
+            )
+
+        self.delimiters = {s.config.csv_delimiter for s in self.signatures}
+
+    def detect(self, statement_csv: Path) -> Detection | None:
+        """The best matching bank config, or None if none of them match"""
+        with statement_csv.open("rb") as f:
+            head = f.read(HEAD_BYTES).removeprefix(codecs.BOM_UTF8)
+
+        # The encoding is sniffed from all whole lines read, since the header
+        # alone is often ASCII even if the payees aren't
+        newline = line_ending(head)
+        if (end := head.rfind(newline)) >= 0 and len(head) == HEAD_BYTES:
+            head = head[: end + 1]
+        encoding, text = _decode(head)
+        header_text, _, rest = text.partition(newline.decode())
+        row_text = rest.partition(newline.decode())[0]
+
+        headers, rows = {}, {}
+        for delimiter in self.delimiters:
+            header = _split(header_text, delimiter)
+            # the last one wins, as when the converter resolves the columns
+            headers[delimiter] = {normalize(key): i for i, key in enumerate(header)}
+            rows[delimiter] = _split(row_text, delimiter)
+
+        best, best_score = None, None
+        for signature in self.signatures:
+            delimiter = signature.config.csv_delimiter
+            header = headers[delimiter]
+            if not signature.required <= header.keys():
+                continue
+
+            matched = len(signature.required) + len(signature.optional & header.keys())
+            score = (matched, _date_fits(signature, header, rows[delimiter]))
+            if best_score is None or score > best_score:
+                best, best_score = signature, score
+
+        if best is None:
+            return None
+
+        return Detection(
+            best.config_path, best.config, encoding, best.config.csv_delimiter
+        )
+
+
+def _decode(data: bytes) -> tuple[str, str]:
+    for encoding in ENCODINGS:
+        try:
+            return encoding, data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+
+    raise AssertionError("latin-1 decodes any bytes")
+
+
+def _split(line: str, delimiter: str) -> list[str]:
+    return next(csv.reader([line], delimiter=delimiter, skipinitialspace=True), [])
+
+
+def _date_fits(signature: Signature, header: dict[str, int], row: list[str]) -> bool:
+    """Whether the date of the first row fits the config's date format"""
+    i = header[signature.date_key]
+    if i >= len(row):
+        return False
+
+    try:
+        datetime.strptime(row[i].strip(), signature.config.date_format)
+    except ValueError:
+        return False
+    return True
+
+
+_detectors: dict[Path, BankDetector] = {}
+
+
+def _detector(bank_dir: Path) -> BankDetector:
+    """The detector of a directory, indexed again once its configs change"""
+    detector = _detectors.get(bank_dir)
+    if detector is None or detector.stamp != configs_stamp(bank_dir):
+        detector = _detectors[bank_dir] = BankDetector(bank_dir)
+    return detector
+
+
+def detect_bank(statement_csv: Path, bank_dir: Path) -> Detection | None:
+    """Detect the bank of a statement among the configs in ``bank_dir``
+
+    The configs are indexed the first time a directory is used, and again
+    whenever a config in it was added, removed or changed.
+    """
+    return _detector(bank_dir.resolve()).detect(statement_csv)
@@ -0,0 +1,87 @@
+"""Collect the issues found in a statement and report them once.
+
+Warning about every bad row of a badly formatted export is slow and buries
+the output. Diagnostics instead counts the issues per category, keeps the
+first few rows of each as samples, and warns once with a summary. All
+rejected rows can also be streamed to a csv side file.
+"""
+
+from collections import Counter
+import csv
+from pathlib import Path
+from typing import TextIO
+import warnings
+
+EMPTY = "empty row"
+OVERFLOW = "excess columns"
+BAD_FORMAT = "incorrectly formatted row"
+# the issues of rows that are still converted, which aren't rejects
+CONVERTED = frozenset({OVERFLOW})
+
+
+class Diagnostics:
+    def __init__(self, max_samples: int = 5, rejects_csv: Path | None = None):
+        """
+        :param max_samples: the number of rows kept per category for the summary.
+        :param rejects_csv: if given, every rejected row is written to this
+            csv-file, as its category, line, reason and values. Rows with
+            issues that are still converted (see CONVERTED) are left out.
+        """
+        self.max_samples = max_samples
+        self.rejects_csv = rejects_csv
+        self.counts: Counter = Counter()
+        self.samples: dict[str, list[str]] = {}
+        self._rejects_file: TextIO | None = None
+        self._rejects_writer = None
+        self._warned = False
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def report(
+        self,
+        category: str,
+        row: dict | list,
+        line: int | None = None,
+        reason: str = "",
+    ):
+        """Count an issue, keeping the row only if it's one of the first"""
+        self.counts[category] += 1
+        samples = self.samples.setdefault(category, [])
+        if len(samples) < self.max_samples:
+            where = "" if line is None else f"line {line}: "
+            because = f" ({reason})" if reason else ""
+            samples.append(f"{where}{row}{because}")
+
+        if self.rejects_csv is not None and category not in CONVERTED:
+            self._reject(category, row, line, reason)
+
+    def _reject(self, category: str, row: dict | list, line: int | None, reason: str):
+        if self._rejects_writer is None:
+            self._rejects_file = self.rejects_csv.open(
+                "w", encoding="utf-8", newline=""
+            )
+            self._rejects_writer = csv.writer(self._rejects_file)
+            self._rejects_writer.writerow(["category", "line", "reason", "row"])
+
+        values = row.values() if isinstance(row, dict) else row
+        self._rejects_writer.writerow(
+            [category, "" if line is None else line, reason, *values]
+        )
+
+    def summary(self) -> str:
+        lines = [f"{len(self)} issue(s) found in the statement:"]
+        for category, count in self.counts.items():
+            lines.append(f"\t{count} {category}(s), e.g.")
+            lines.extend(f"\t\t{sample}" for sample in self.samples[category])
+        return "\n".join(lines)
+
+    def close(self):
+        """Warn with the summary (if there were issues) and close the rejects"""
+        if self._rejects_file is not None:
+            self._rejects_file.close()
+            self._rejects_file, self._rejects_writer = None, None
+
+        if len(self) > 0 and not self._warned:
+            warnings.warn(f"\n{self.summary()}", RuntimeWarning)
+            self._warned = True
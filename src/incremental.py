@@ -0,0 +1,74 @@
+"""Watermarks of already converted transactions.
+
+A watermark records the date of the newest transaction converted from an
+account, together with fingerprints of the transactions on that date. Rows
+that are older than the watermark, or that were already converted on the
+watermark date, are skipped the next time a statement of the account is
+converted.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+from typing import Iterable, NamedTuple
+
+STATE_FILE = Path("bank2ynab_state.json")
+
+
+def fingerprint(values: Iterable) -> str:
+    """A short hash identifying a converted transaction"""
+    key = "\x1f".join("" if v is None else str(v) for v in values)
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class Watermark(NamedTuple):
+    date: str = ""  # YNAB date of the newest converted transaction
+    fingerprints: dict[str, int] = {}  # occurrences of each transaction on that date
+
+    def merge(self, other: "Watermark") -> "Watermark":
+        """The watermark after converting the transactions of both"""
+        if self.date != other.date:
+            return max(self, other, key=lambda w: w.date)
+
+        fps = self.fingerprints.keys() | other.fingerprints.keys()
+        return Watermark(
+            self.date,
+            {
+                fp: max(self.fingerprints.get(fp, 0), other.fingerprints.get(fp, 0))
+                for fp in fps
+            },
+        )
+
+
+class WatermarkStore:
+    """Watermarks per bank and account, persisted in a JSON state file"""
+
+    def __init__(self, path: Path = STATE_FILE):
+        self.path = path
+        self._state: dict[str, dict[str, dict]] = {}
+        if path.is_file():
+            with path.open(encoding="utf-8") as f:
+                self._state = json.load(f)
+
+    def get(self, bank: str, account: str = "") -> Watermark:
+        watermark = self._state.get(bank, {}).get(account)
+        if watermark is None:
+            return Watermark()
+
+        return Watermark(watermark["date"], watermark["fingerprints"])
+
+    def set(self, bank: str, account: str, watermark: Watermark):
+        self._state.setdefault(bank, {})[account] = watermark._asdict()
+
+    def save(self):
+        """Atomically replace the state file"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,78 @@
+"""Counters and per-stage timings of conversions.
+
+A Converter fills in a ConversionMetrics while rows stream through it. The
+metrics can be exported as JSON or in the Prometheus text format (e.g. for
+the node exporter's textfile collector).
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+import json
+from pathlib import Path
+
+# "tokenize" covers re-joining split amounts, padding short rows and finding
+# empty rows, and "ignore" normalizing the payees and matching them
+STAGES = ("read", "tokenize", "ignore", "amounts", "dates", "dedup", "write")
+
+
+@dataclass
+class ConversionMetrics:
+    # seconds spent per stage; "write" is the time not spent in other stages
+    seconds: dict[str, float] = field(
+        default_factory=lambda: dict.fromkeys(STAGES, 0.0)
+    )
+    # rows per outcome: empty, ignored, read, parsed, skipped, duplicate
+    rows: Counter = field(default_factory=Counter)
+    bytes_read: int = 0
+    # errors by type, e.g. rows that could not be parsed
+    errors: Counter = field(default_factory=Counter)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def merge(self, other: "ConversionMetrics") -> "ConversionMetrics":
+        """Sum the metrics of two conversions"""
+        return ConversionMetrics(
+            seconds={s: self.seconds[s] + other.seconds[s] for s in STAGES},
+            rows=self.rows + other.rows,
+            bytes_read=self.bytes_read + other.bytes_read,
+            errors=self.errors + other.errors,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "seconds": dict(self.seconds),
+            "rows": dict(self.rows),
+            "bytes_read": self.bytes_read,
+            "errors": dict(self.errors),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = "bank2ynab") -> str:
+        lines = []
+
+        def metric(name: str, help: str, label: str | None, values: dict):
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            for key, value in values.items():
+                labels = "" if label is None else f'{{{label}="{key}"}}'
+                lines.append(f"{prefix}_{name}{labels} {value}")
+
+        metric(
+            "stage_seconds", "Time spent per conversion stage.", "stage", self.seconds
+        )
+        metric("rows", "Number of rows per outcome.", "outcome", self.rows)
+        metric("bytes_read", "Bytes read from statements.", None, {"": self.bytes_read})
+        metric("errors", "Number of errors per type.", "type", self.errors)
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path):
+        """Write the metrics in Prometheus format to a '.prom' file, else as JSON"""
+        if path.suffix == ".prom":
+            path.write_text(self.to_prometheus(), encoding="utf-8")
+        else:
+            path.write_text(self.to_json(), encoding="utf-8")
@@ -0,0 +1,84 @@
+"""Profile conversions to find out why a bank format is slow.
+
+The conversion is profiled with cProfile, or with pyinstrument (a sampling
+profiler with less overhead) if it is installed and asked for. Either way a
+'.prof' file that can be loaded with pstats (or e.g. snakeviz) is written,
+along with a '.prof.txt' summary of the hottest functions.
+"""
+
+from contextlib import contextmanager
+import cProfile
+import io
+from pathlib import Path
+import pstats
+from typing import Iterator
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+# (file, function) of the hot spots that are summarized on their own
+WATCHED = (
+    ("converter.py", "parse"),
+    ("converter.py", "_parse"),
+    ("_strptime.py", "_strptime_datetime"),
+    ("~", "<method 'writerow' of '_csv.writer' objects>"),
+    ("~", "<method 'writerows' of '_csv.writer' objects>"),
+)
+
+
+def summary_file(prof_file: Path) -> Path:
+    return prof_file.with_name(f"{prof_file.name}.txt")
+
+
+@contextmanager
+def profile(prof_file: Path, profiler: str = "cprofile", top: int = 20) -> Iterator:
+    """Profile the block and write ``prof_file`` and a summary next to it"""
+    if profiler == "cprofile":
+        profiler_ = cProfile.Profile()
+        profiler_.enable()
+        try:
+            yield
+        finally:
+            profiler_.disable()
+            profiler_.dump_stats(prof_file)
+    elif profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+            from pyinstrument.renderers import PstatsRenderer
+        except ImportError:
+            raise ValueError("The pyinstrument profiler is not installed")
+
+        profiler_ = Profiler()
+        profiler_.start()
+        try:
+            yield
+        finally:
+            profiler_.stop()
+            stats = profiler_.output(PstatsRenderer())
+            prof_file.write_bytes(stats.encode("utf-8", errors="surrogateescape"))
+    else:
+        raise ValueError(f"Unknown {profiler=}, expected one of {PROFILERS}")
+
+    summary_file(prof_file).write_text(summarize(prof_file, top), encoding="utf-8")
+
+
+def summarize(prof_file: Path, top: int = 20) -> str:
+    """Summarize the ``top`` functions by cumulative and by own time"""
+    out = io.StringIO()
+    stats = pstats.Stats(str(prof_file), stream=out).strip_dirs()
+
+    print("Hot spots of the conversion:", file=out)
+    watched = sorted(
+        (key, value)
+        for key, value in stats.stats.items()
+        if (key[0], key[2]) in WATCHED
+    )
+    for (file, line, function), (_, calls, own, cumulative, _) in watched:
+        print(
+            f"  {file}:{line}({function}): {calls} calls, "
+            f"{own:.3f}s own, {cumulative:.3f}s cumulative",
+            file=out,
+        )
+
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top)
+    return out.getvalue()
@@ -0,0 +1,98 @@
+"""Read statements through a memory map.
+
+The statement is mapped rather than read into buffers, its BOM (if any) is
+skipped, and lines are found on the raw bytes. They end on a line feed
+(which also ends CRLF lines), or on a carriage return if that is how the
+first line ends, as in old Mac exports. Each line is decoded only when the
+csv reader asks for it, so a statement is never held in memory as a whole,
+and a byte range of it (e.g. a chunk) can be read without copying the rest.
+"""
+
+import codecs
+import mmap
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+
+class MappedStatement:
+    def __init__(self, statement_csv: Path, encoding: str = "utf-8"):
+        self.path = statement_csv
+        self.encoding = encoding
+        self.start = 0  # the offset of the first line, i.e., after the BOM
+        self.offset = 0  # the end of the last line that was read
+        self.newline = b"\n"  # the byte that ends the lines
+        self._file: BinaryIO | None = None
+        self._map: mmap.mmap | bytes = b""
+
+    def __enter__(self) -> "MappedStatement":
+        self._file = self.path.open("rb")
+        try:
+            # an empty file can't be mapped, but there is nothing to read anyway
+            if self.path.stat().st_size > 0:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+
+        if self._map[: len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+            self.start = len(codecs.BOM_UTF8)
+        self.offset = self.start
+        self.newline = line_ending(self._map, self.start)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = b""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def line_end(self, pos: int, end: int | None = None) -> int:
+        """The offset after the line ending of the line that ``pos`` is on"""
+        end = len(self._map) if end is None else end
+        newline = self._map.find(self.newline, pos, end)
+        return end if newline < 0 else newline + 1
+
+    def count(self, sub: bytes, start: int, end: int, block_size: int = 1 << 20) -> int:
+        """The number of times a byte occurs between two offsets"""
+        return sum(
+            self._map[pos : min(pos + block_size, end)].count(sub)
+            for pos in range(start, end, block_size)
+        )
+
+    def lines(self, start: int | None = None, end: int | None = None) -> Iterator[str]:
+        """Decode the lines (with their line endings) between two byte offsets
+
+        The range defaults to the whole statement, after the BOM.
+        """
+        pos = self.start if start is None else start
+        end = len(self._map) if end is None else end
+        data, encoding, ending = self._map, self.encoding, self.newline
+        while pos < end:
+            newline = data.find(ending, pos, end)
+            stop = end if newline < 0 else newline + 1
+            line = data[pos:stop].decode(encoding)
+            self.offset = pos = stop
+            yield line
+
+
+def line_ending(data: mmap.mmap | bytes, start: int = 0) -> bytes:
+    """The byte that ends the lines of a statement, as found on its first line
+
+    A carriage return ends the lines if the first one is not followed by a
+    line feed, like the csv module reads them. Otherwise it is a line feed,
+    which also ends CRLF lines.
+    """
+    lf = data.find(b"\n", start)
+    cr = data.find(b"\r", start, len(data) if lf < 0 else lf)
+    if cr >= 0 and cr + 1 != lf:
+        return b"\r"
+
+    return b"\n"
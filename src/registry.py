@@ -0,0 +1,183 @@
+"""Find and load the bank configs without parsing them over and over.
+
+Listing the banks only needs their names. The names are kept in an index
+in a cache directory, and a config is only read again once its file has
+changed, i.e., when its modification time or size differs from the one in
+the index. The directory is only listed again once its modification time
+has changed (since files were added or removed).
+
+Loaded configs are kept in memory, and pickled to the cache directory (one
+file per directory of configs), so that a new worker process gets every
+config it has seen before with a single read, rather than parsing and
+validating each TOML file again.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import pickle
+import tempfile
+from typing import NamedTuple
+
+import tomli
+
+from . import config as config_module
+from .config import BankConfig
+
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "bank2ynab"
+
+
+class BankEntry(NamedTuple):
+    name: str
+    path: Path
+
+
+def _stamp(path: Path) -> list[int] | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None  # e.g. it was removed
+
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def configs_stamp(bank_dir: Path) -> list:
+    """A stamp that changes whenever a config is added, removed or changed"""
+    return [[path.name, _stamp(path)] for path in sorted(bank_dir.glob("*.toml"))]
+
+
+def _cache_file(cache_dir: Path, path: Path, suffix: str) -> Path:
+    """A file in the cache that belongs to ``path``"""
+    key = hashlib.blake2b(str(path.resolve()).encode(), digest_size=8).hexdigest()
+    return cache_dir / f"{path.name}-{key}{suffix}"
+
+
+def bank_index(bank_dir: Path, cache_dir: Path | None = None) -> list[BankEntry]:
+    """List the banks in a directory of TOML configs, sorted by name
+
+    Configs that can't be read or have no name are left out, but are kept
+    in the index (without a name) so that they are read again once fixed.
+    """
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    index_path = _cache_file(cache_dir, bank_dir, ".json")
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        index = {}
+
+    dir_stamp = _stamp(bank_dir)
+    files: dict[str, dict] = index.get("files", {})
+    if index.get("dir") != dir_stamp:
+        paths = sorted(bank_dir.glob("*.toml"))
+    else:
+        paths = [bank_dir / name for name in files]
+
+    updated = {}
+    for path in paths:
+        stamp = _stamp(path)
+        if (entry := files.get(path.name)) is not None and entry["stamp"] == stamp:
+            updated[path.name] = entry
+            continue
+
+        try:
+            with path.open("rb") as f:
+                name = tomli.load(f)["name"]
+        except (OSError, ValueError, KeyError):
+            name = None
+        if not isinstance(name, str):
+            name = None
+        updated[path.name] = {"name": name, "stamp": stamp}
+
+    if index.get("dir") != dir_stamp or updated != files:
+        _save_json(index_path, {"dir": dir_stamp, "files": updated})
+
+    return sorted(
+        BankEntry(entry["name"], bank_dir / name)
+        for name, entry in updated.items()
+        if entry["name"] is not None
+    )
+
+
+class ConfigRegistry:
+    """Loads bank configs, each only once for as long as its file is unchanged
+
+    The loaded configs are shared, so they must not be modified.
+    """
+
+    def __init__(self, cache_dir: Path | None = None):
+        self.cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+        # the stamp of each config file and the config loaded from it
+        self._configs: dict[Path, tuple[list[int] | None, BankConfig]] = {}
+        self._cached_dirs: set[Path] = set()  # whose pickle has been read
+
+    def load(self, toml_config: Path) -> BankConfig:
+        path = toml_config.resolve()
+        if path.parent not in self._cached_dirs:
+            self._configs.update(self._read_pickle(path.parent))
+            self._cached_dirs.add(path.parent)
+
+        stamp = _stamp(path)
+        if (cached := self._configs.get(path)) is not None and cached[0] == stamp:
+            return cached[1]
+
+        config = BankConfig.from_file(path)
+        self._configs[path] = (stamp, config)
+        self._write_pickle(path.parent)
+        return config
+
+    def _read_pickle(self, bank_dir: Path) -> dict:
+        try:
+            with _cache_file(self.cache_dir, bank_dir, ".pickle").open("rb") as f:
+                code_stamp, configs = pickle.load(f)
+        except Exception:
+            return {}  # e.g. there is no cache yet, or it's corrupt
+
+        # configs pickled by another version of the code may not fit this one
+        if code_stamp != _stamp(Path(config_module.__file__)):
+            return {}
+
+        return {bank_dir / name: cached for name, cached in configs.items()}
+
+    def _write_pickle(self, bank_dir: Path):
+        configs = {
+            path.name: cached
+            for path, cached in self._configs.items()
+            if path.parent == bank_dir
+        }
+        code_stamp = _stamp(Path(config_module.__file__))
+        try:
+            data = pickle.dumps((code_stamp, configs))
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return  # e.g. a config with a normalizer that can't be pickled
+
+        _save(_cache_file(self.cache_dir, bank_dir, ".pickle"), data)
+
+
+_registry = ConfigRegistry()
+
+
+def load_config(toml_config: Path) -> BankConfig:
+    """Load a bank config, from the cache if the file hasn't changed since"""
+    return _registry.load(toml_config)
+
+
+def _save_json(path: Path, data: dict):
+    _save(path, json.dumps(data, indent=1, sort_keys=True).encode("utf-8"))
+
+
+def _save(path: Path, data: bytes):
+    """Atomically replace a cache file, unless the cache isn't writable"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    except OSError:
+        return  # it's only a cache
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,162 @@
+"""Where the converted rows are written.
+
+A conversion opens its sink with YNAB's header once it has a row to write,
+writes the formatted rows to it in batches, and closes it once all rows are
+written, or aborts it if the conversion failed or was cancelled. The file
+sinks write to a temporary file that only replaces the output when the
+sink is closed, so an aborted conversion leaves no partial output behind,
+and conversions to different sinks can run side by side in one process.
+"""
+
+from abc import ABC, abstractmethod
+import csv
+import gzip
+import io
+import os
+from pathlib import Path
+import secrets
+import sys
+from typing import Sequence, TextIO, TypeAlias
+
+# A row of YNAB's csv format, with its amounts formatted as decimal strings
+OutputRow: TypeAlias = tuple[str | None, ...]
+
+
+class Sink(ABC):
+    """Receives the rows of a conversion
+
+    ``open`` is called once, then ``write`` per batch of rows, and finally
+    either ``close`` or (if the conversion failed) ``abort``.
+    """
+
+    @abstractmethod
+    def open(self, header: Sequence[str]):
+        """Start the output with YNAB's header"""
+
+    @abstractmethod
+    def write(self, rows: Sequence[OutputRow]):
+        """Write a batch of rows"""
+
+    def close(self):
+        pass
+
+    def abort(self):
+        self.close()
+
+
+class CsvFileSink(Sink):
+    """Writes the rows to a csv-file, atomically"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._tmp_path: Path | None = None
+        self._file: TextIO | None = None
+        self._writer = None
+
+    def __str__(self) -> str:
+        return f"File {self.path}"
+
+    def _open_file(self, path: Path) -> TextIO:
+        return path.open("x", encoding="utf-8", newline="")
+
+    def open(self, header: Sequence[str]):
+        name = f".{self.path.name}.{secrets.token_hex(4)}.tmp"
+        self._tmp_path = self.path.with_name(name)
+        self._file = self._open_file(self._tmp_path)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(header)
+
+    def write(self, rows: Sequence[OutputRow]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        self._file, self._writer = None, None
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._tmp_path.unlink(missing_ok=True)
+            self._file, self._writer = None, None
+
+
+class GzipCsvSink(CsvFileSink):
+    """Writes the rows to a gzip-compressed csv-file, atomically"""
+
+    def _open_file(self, path: Path) -> TextIO:
+        return gzip.open(path, "xt", encoding="utf-8", newline="")
+
+
+class MemorySink(Sink):
+    """Keeps the rows in memory, e.g. to convert without touching the disk
+
+    The rows are only kept once the sink is closed.
+    """
+
+    def __init__(self):
+        self.header: tuple[str, ...] = ()
+        self.rows: list[OutputRow] = []
+        self._pending: list[OutputRow] = []
+
+    def __str__(self) -> str:
+        return "<memory>"
+
+    def open(self, header: Sequence[str]):
+        self.header = tuple(header)
+        self._pending = []
+
+    def write(self, rows: Sequence[OutputRow]):
+        self._pending.extend(rows)
+
+    def close(self):
+        self.rows, self._pending = self._pending, []
+
+    def abort(self):
+        self._pending = []
+
+    def to_csv(self) -> str:
+        out = io.StringIO(newline="")
+        writer = csv.writer(out)
+        writer.writerow(self.header)
+        writer.writerows(self.rows)
+        return out.getvalue()
+
+
+class StdoutSink(Sink):
+    """Streams the rows to stdout (or another text stream) as csv
+
+    The rows are written as they are converted, so unlike the other sinks,
+    a failed conversion leaves the rows written so far behind.
+    """
+
+    def __init__(self, stream: TextIO | None = None):
+        self.stream = stream
+        self._stream: TextIO | None = None
+        self._writer = None
+
+    def __str__(self) -> str:
+        return "<stdout>"
+
+    def open(self, header: Sequence[str]):
+        # resolved here rather than on init, in case sys.stdout was replaced
+        self._stream = sys.stdout if self.stream is None else self.stream
+        self._writer = csv.writer(self._stream)
+        self._writer.writerow(header)
+
+    def write(self, rows: Sequence[OutputRow]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.flush()
+            self._stream, self._writer = None, None
+
+
+def as_sink(output: Sink | Path) -> Sink:
+    """A sink for the output, which is written as csv if it's a path"""
+    if isinstance(output, Sink):
+        return output
+    elif output.suffix == ".gz":
+        return GzipCsvSink(output)
+    return CsvFileSink(output)
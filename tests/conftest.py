@@ -0,0 +1,13 @@
+from src import registry
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path_factory, monkeypatch):
+    """Keep the cached bank configs out of the user's cache directory"""
+    cache_dir = tmp_path_factory.mktemp("cache") / "bank2ynab"
+    # worker processes that import the registry anew read the environment
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_dir.parent))
+    monkeypatch.setattr(registry, "CACHE_DIR", cache_dir)
+    monkeypatch.setattr(registry, "_registry", registry.ConfigRegistry(cache_dir))
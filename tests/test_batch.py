@@ -0,0 +1,169 @@
+import csv
+from pathlib import Path
+
+from util import load_test_example, load_bank_config, net_flow
+from src.batch import BatchJob, convert_many, expand_statements, split_statement
+
+import pytest
+
+
+def revolut_jobs() -> list[BatchJob]:
+    toml_path = load_bank_config("revolut_v2.toml")
+    return [
+        BatchJob(toml_path, load_test_example("revolut_v2.csv")),
+        BatchJob(
+            toml_path, load_test_example("regression/revolut_v2_regression_01.csv")
+        ),
+    ]
+
+
+def test_convert_many(tmp_path):
+    jobs = revolut_jobs()
+    results = convert_many(jobs, tmp_path, max_workers=2)
+
+    assert [r.result for r in results] == [(True, 0, 0, 5, 5)] * 2
+    assert [r.output_csv.name for r in results] == [
+        "revolut_v2_ynab.csv",
+        "revolut_v2_regression_01_ynab.csv",
+    ]
+    assert all(r.output_csv.parent == tmp_path for r in results)
+
+
+def test_convert_many_merged(tmp_path):
+    jobs = revolut_jobs()
+    results = convert_many(jobs, tmp_path, merge="merged.csv", max_workers=2)
+
+    merged_csv = tmp_path / "merged.csv"
+    assert all(r.converted and r.output_csv == merged_csv for r in results)
+    assert [p.name for p in tmp_path.iterdir()] == ["merged.csv"]
+
+    rows = merged_csv.read_text(encoding="utf-8").splitlines()
+    assert len(rows) == 1 + 5 + 5
+    assert rows[0] == "Date,Payee,Category,Memo,Outflow,Inflow"
+
+    separate = convert_many(jobs, tmp_path)
+    assert net_flow(merged_csv) == sum(net_flow(r.output_csv) for r in separate)
+
+
+def test_convert_many_reports_errors(tmp_path):
+    (missing := tmp_path / "missing.csv").touch()
+    missing.unlink()
+    job = BatchJob(load_bank_config("revolut_v2.toml"), missing)
+
+    (result,) = convert_many([job], tmp_path)
+    assert not result.converted
+    assert result.error is not None
+
+
+def test_expand_statements():
+    examples = load_test_example("revolut_v2.csv").parent
+    glob_matches = expand_statements([str(examples / "*_v2.csv")])
+    dir_matches = expand_statements([str(examples)])
+
+    assert [p.name for p in glob_matches] == ["nordea_v2.csv", "revolut_v2.csv"]
+    assert set(glob_matches) < set(dir_matches)
+    assert all(p.suffix == ".csv" and p.parent == examples for p in dir_matches)
+
+
+@pytest.fixture
+def large_statement(tmp_path) -> Path:
+    """A Revolut statement where some descriptions span several lines"""
+    rows = [load_test_example("revolut_v2.csv").read_text().splitlines()[0]]
+    for i in range(200):
+        description = f'"Multi-line\n""quoted"" {i}"' if i % 3 == 0 else f"Shop {i}"
+        rows.append(
+            f"CARD_PAYMENT,Current,2021-10-01 22:36:{i % 60:02d},,"
+            f"{description},-{i}.25,0.{i % 10},SEK,COMPLETED,0"
+        )
+
+    statement = tmp_path / "large.csv"
+    statement.write_text("\n".join(rows) + "\n", encoding="utf-8")
+    return statement
+
+
+def test_split_statement(large_statement):
+    header_end, chunks = split_statement(large_statement, chunk_size=500)
+    data = large_statement.read_bytes()
+
+    assert data[header_end - 1 : header_end] == b"\n"
+    assert chunks[0][0] == header_end and chunks[-1][1] == len(data)
+    assert all(end == start for (_, end), (start, _) in zip(chunks, chunks[1:]))
+    for start, end in chunks:
+        assert data[start:end].count(b'"') % 2 == 0
+        assert data[start:end].endswith(b"\n")
+
+
+def test_convert_chunked(tmp_path, large_statement):
+    job = BatchJob(load_bank_config("revolut_v2.toml"), large_statement)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    (chunked,) = convert_many([job], out_dir, merge="chunked.csv", chunk_size=1000)
+    (whole,) = convert_many([job], out_dir, merge="whole.csv")
+
+    assert chunked.result == whole.result == (True, 0, 0, 200, 200)
+    assert chunked.output_csv.read_text() == whole.output_csv.read_text()
+
+
+def test_convert_chunked_carriage_returns(tmp_path, large_statement):
+    data = large_statement.read_bytes()
+    large_statement.write_bytes(data.replace(b"\n", b"\r"))
+    job = BatchJob(load_bank_config("revolut_v2.toml"), large_statement)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    header_end, chunks = split_statement(large_statement, chunk_size=500)
+    assert len(chunks) > 1
+    assert all(data[end - 1 : end] == b"\n" for _, end in chunks)
+
+    (chunked,) = convert_many([job], out_dir, merge="chunked.csv", chunk_size=1000)
+    assert chunked.result == (True, 0, 0, 200, 200)
+
+
+def test_chunked_line_numbers(tmp_path, large_statement):
+    # an empty row at the end, i.e., in the last chunk
+    with large_statement.open("a", encoding="utf-8") as f:
+        f.write(",,,,,,,,,\n")
+    empty_line = len(large_statement.read_text(encoding="utf-8").splitlines())
+    job = BatchJob(load_bank_config("revolut_v2.toml"), large_statement)
+
+    rejected = {}
+    for name, chunk_size in [("whole", None), ("chunked", 1000)]:
+        (out_dir := tmp_path / name).mkdir()
+        convert_many([job], out_dir, chunk_size=chunk_size, rejects=True)
+        rejected[name] = [
+            row[1]
+            for rejects_csv in sorted(out_dir.glob("*_rejects*.csv"))
+            for row in csv.reader(rejects_csv.open(encoding="utf-8", newline=""))
+            if row[0] != "category"
+        ]
+
+    assert rejected["whole"] == [str(empty_line)]
+    assert rejected["chunked"] == rejected["whole"]
+
+
+def test_failed_conversion_keeps_earlier_output(tmp_path):
+    (statement := tmp_path / "statement.csv").write_text(
+        "Date,Payee,Outflow\n2021-01-01,Shop,10.00\n", encoding="utf-8"
+    )
+    (out_dir := tmp_path / "out").mkdir()
+    (output_csv := out_dir / "statement_ynab.csv").write_text("an earlier run")
+
+    job = BatchJob(load_bank_config("revolut_v2.toml"), statement)
+    (result,) = convert_many([job], out_dir)
+    assert result.error is not None
+    assert output_csv.read_text() == "an earlier run"
+
+
+def test_merge_keeps_earlier_output(tmp_path):
+    (statement := tmp_path / "statement.csv").write_text(
+        "Date,Payee,Outflow\n2021-01-01,Shop,10.00\n", encoding="utf-8"
+    )
+    (out_dir := tmp_path / "out").mkdir()
+    (merged_csv := out_dir / "merged.csv").write_text("an earlier run")
+
+    job = BatchJob(load_bank_config("revolut_v2.toml"), statement)
+    (result,) = convert_many([job], out_dir, merge="merged.csv")
+    assert result.error is not None
+    assert merged_csv.read_text() == "an earlier run"
+    assert sorted(out_dir.iterdir()) == [merged_csv]
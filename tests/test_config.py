@@ -47,6 +47,14 @@ def test_load_template_config():
     BankConfig.from_file(config)
 
 
+def test_positional_args():
+    config = BankConfig(
+        "Bank", "%Y-%m-%d", "", ".", "Date", "Outflow", "Inflow", "Payee", "Memo"
+    )
+    assert (config.payee_column, config.memo_column) == ("Payee", "Memo")
+    assert config.currency_format.decimals == 2
+
+
 # ----------- Test invalid inputs -----------
 
 
@@ -114,3 +122,26 @@ def test_invalid_config_invalid_currency_format_thousands(valid_config_dict):
         valid_config_dict["currency_format"] = fmt
         with pytest.raises(ValueError):
             BankConfig.from_dict(valid_config_dict)
+
+
+def test_invalid_config_accignore_not_list(valid_config_dict):
+    valid_config_dict["accignore"] = "123456789"
+    with pytest.raises(TypeError):
+        BankConfig.from_dict(valid_config_dict)
+
+
+def test_text_transform(valid_config_dict):
+    valid_config_dict["text_transform"] = {"memo": "none"}
+    config = BankConfig.from_dict(valid_config_dict)
+    assert config.text_transform == {
+        "payee": "strip",
+        "category": "strip",
+        "memo": "none",
+    }
+
+
+@pytest.mark.parametrize("text_transform", [{"memo": "shout"}, {"outflow": "strip"}])
+def test_invalid_config_text_transform(valid_config_dict, text_transform):
+    valid_config_dict["text_transform"] = text_transform
+    with pytest.raises(ValueError):
+        BankConfig.from_dict(valid_config_dict)
@@ -1,8 +1,17 @@
 from pathlib import Path
 
+import pytest
+import tomli
+
 from util import load_test_example, load_bank_config, load_template_config, net_flow
-from src.converter import bank2ynab
-from src.config import BankConfig
+from src.converter import (
+    ConversionCancelled,
+    Converter,
+    IgnoreMatcher,
+    SplitAmountJoiner,
+    bank2ynab,
+)
+from src.config import BankConfig, CurrencyFormat
 
 
 def test_ica_banken_v1():
@@ -48,3 +57,228 @@ def test_identity():
     net_converted = net_flow(Path.cwd() / "ynabImport.csv")
     assert net_bank == net_converted
     print(f"{net_converted=}")
+
+
+def test_streaming_stages_are_lazy():
+    csv_path = load_test_example("nordea_v2.csv")
+    toml_path = load_bank_config("nordea_v2.toml")
+    converter = Converter(BankConfig.from_file(toml_path))
+
+    parsed = converter.parseRows(converter.readInput(csv_path, []))
+    assert converter.numReadRows == 0  # nothing is read until consumed
+
+    first = next(parsed)
+    assert converter.numReadRows == 1
+    assert converter.numParsedRows == 1
+    assert first[0] == "2021/04/24"
+
+    assert len(list(parsed)) == 3
+    assert (converter.numReadRows, converter.numParsedRows) == (4, 4)
+
+
+def test_row_plan_is_normalized():
+    toml_path = load_bank_config("revolut_v2.toml")
+    converter = Converter(BankConfig.from_file(toml_path))
+
+    plan = converter.plan
+    assert plan.date_key == "started date"
+    assert plan.payee_key == "description"
+    assert plan.memo_key is None
+    assert sorted(key for key, _ in plan.transaction_columns) == ["amount", "fee"]
+    assert plan.output_fields == tuple(converter.ynab_header)
+
+
+def test_accignore():
+    csv_path = load_test_example("revolut_v2.csv")
+    toml_path = load_bank_config("revolut_v2.toml")
+    revolut_config = BankConfig.from_file(toml_path)
+
+    # every row is classified once, no matter how many accounts match
+    expect = (True, 0, 3, 2, 2)
+    result = bank2ynab(
+        revolut_config, csv_path, toIgnore=["PayPal", "paypal *", "*xxx"]
+    )
+    assert expect == result
+
+
+def test_accignore_from_config():
+    csv_path = load_test_example("revolut_v2.csv")
+    toml_path = load_bank_config("revolut_v2.toml")
+    with toml_path.open("rb") as f:
+        config_dict = tomli.load(f)
+    config_dict["accignore"] = ["bandcamp"]
+    revolut_config = BankConfig.from_dict(config_dict)
+
+    expect = (True, 0, 2, 3, 3)
+    result = bank2ynab(revolut_config, csv_path, toIgnore=["Top-Up"])
+    assert expect == result
+
+
+def test_ignore_matcher():
+    matcher = IgnoreMatcher(["1234", "12", "5678", "56789", "a.b", ""])
+
+    assert len(matcher) == 5
+    assert matcher.matches("transfer to 5678")
+    assert matcher.matches("x12x")
+    assert matcher.matches("a.b")
+    assert not matcher.matches("axb")
+    assert not matcher.matches("567")
+    assert not IgnoreMatcher([]).matches("anything")
+
+
+def test_columns_are_resolved_from_header(tmp_path):
+    converter = Converter(BankConfig.from_file(load_template_config()))
+    statement = tmp_path / "statement.csv"
+    # the columns are in another order, and the second row is short
+    statement.write_text(
+        "Inflow,Outflow,Payee,Date,Memo,Category\n"
+        ",10.00,Shop,2021-01-01,,\n"
+        "1.00,,Employer,2021-01-02\n",
+        encoding="utf-8",
+    )
+
+    rows = list(converter.parseRows(converter.readInput(statement, [])))
+    assert converter.columns.date == 3
+    assert rows == [
+        ("2021/01/01", "Shop", "", "", 1000, 0),
+        ("2021/01/02", "Employer", "", "", 0, 100),
+    ]
+
+
+def test_missing_column(tmp_path):
+    converter = Converter(BankConfig.from_file(load_template_config()))
+    statement = tmp_path / "statement.csv"
+    statement.write_text("Date,Payee,Outflow\n2021-01-01,Shop,10.00\n")
+
+    with pytest.raises(ValueError, match="inflow"):
+        list(converter.readInput(statement, []))
+
+
+def test_text_transform(tmp_path):
+    with load_template_config().open("rb") as f:
+        config_dict = tomli.load(f)
+    config_dict["text_transform"] = {"payee": "title", "memo": "none"}
+    converter = Converter(BankConfig.from_dict(config_dict))
+    statement = tmp_path / "statement.csv"
+    statement.write_text(
+        "Date,Payee,Category,Memo,Outflow,Inflow\n"
+        '" 2021-01-01 ",  "THE SHOP ",  Food ," a memo ",10.00,\n',
+        encoding="utf-8",
+    )
+
+    rows = list(converter.parseRows(converter.readInput(statement, ["the shop"])))
+    assert converter.numIgnoredRows == 1  # the payee is matched case insensitively
+
+    rows = list(converter.parseRows(converter.readInput(statement, [])))
+    assert rows == [("2021/01/01", "The Shop", "Food", " a memo ", 1000, 0)]
+
+
+def test_line_filter(tmp_path):
+    statement = tmp_path / "statement.csv"
+    statement.write_text(
+        "Date,Payee,Category,Memo,Outflow,Inflow\n"
+        "# a comment that isn't csv\n"
+        "2021-01-01,Shop,,,10.00,\n",
+        encoding="utf-8",
+    )
+    no_comments = lambda lines: (line for line in lines if not line.startswith("#"))
+
+    bank = BankConfig.from_file(load_template_config())
+    output_csv = tmp_path / "out.csv"
+    result = bank2ynab(bank, statement, output_csv, [], line_filter=no_comments)
+    assert result == (True, 0, 0, 1, 1)
+
+
+def test_split_amount_joiner():
+    joiner = SplitAmountJoiner(CurrencyFormat(thousands_sep=",", decimal_point="."))
+
+    assert joiner.join(["a", "1", "234.50", "b"], 3) == ["a", "1,234.50", "b"]
+    assert joiner.join(["1", "234", "567", "0.50"], 2) == ["1,234,567", "0.50"]
+    assert joiner.join(["-1", "000", "12", "345.00 "], 2) == ["-1,000", "12,345.00 "]
+    # only as many fields as there are in excess are joined
+    assert joiner.join(["1", "234", "567.00"], 2) == ["1,234", "567.00"]
+    # fields that can't be part of an amount are left as they are
+    assert joiner.join(["1234", "567.00"], 1) == ["1234", "567.00"]
+    assert joiner.join(["1", "23.00"], 1) == ["1", "23.00"]
+
+
+def test_unquoted_thousands(tmp_path):
+    with load_template_config().open("rb") as f:
+        config_dict = tomli.load(f)
+    config_dict["currency_format"]["thousands_separator"] = ","
+    converter = Converter(BankConfig.from_dict(config_dict))
+    statement = tmp_path / "statement.csv"
+    statement.write_text(
+        "Date,Payee,Category,Memo,Outflow,Inflow\n"
+        '2021-01-01,Shop,,,"1,234.50",\n'
+        "2021-01-02,Shop,,,1,234.50,\n"
+        "2021-01-03,Employer,,,,12,345,678.00\n",
+        encoding="utf-8",
+    )
+
+    rows = list(converter.parseRows(converter.readInput(statement, [])))
+    assert [(outflow, inflow) for *_, outflow, inflow in rows] == [
+        (123450, 0),
+        (123450, 0),
+        (0, 1234567800),
+    ]
+    assert converter.metrics.rows["rejoined"] == 2
+
+
+def test_cancel_leaves_no_output(tmp_path):
+    converter = Converter(BankConfig.from_file(load_template_config()))
+    statement = tmp_path / "statement.csv"
+    rows = [f"2021-01-{day:02d},Shop,,,10.00," for day in range(1, 29)]
+    statement.write_text(
+        "\n".join(["Date,Payee,Category,Memo,Outflow,Inflow", *rows]) + "\n",
+        encoding="utf-8",
+    )
+    output_csv = tmp_path / "out.csv"
+    output_csv.write_text("an earlier conversion", encoding="utf-8")
+
+    def cancel_halfway(lines):
+        for i, line in enumerate(lines):
+            if i == 14:
+                progress = converter.progress()
+                assert 0 < progress.bytes_read < progress.bytes_total
+                assert progress.rows_read == 13
+                converter.cancel()
+            yield line
+
+    converter.line_filter = cancel_halfway
+    with pytest.raises(ConversionCancelled):
+        converter.convert(statement, [], output_csv)
+
+    assert output_csv.read_text(encoding="utf-8") == "an earlier conversion"
+    assert sorted(tmp_path.iterdir()) == [output_csv, statement]
+
+
+def test_failed_write_leaves_no_output(tmp_path):
+    converter = Converter(BankConfig.from_file(load_template_config()))
+    output_csv = tmp_path / "out.csv"
+
+    def rows():
+        yield ("2021/01/01", "Shop", None, None, 1000, 0)
+        raise OSError("the statement went away")
+
+    with pytest.raises(OSError):
+        converter.writeOutput(rows(), output_csv)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unquoted_thousands_revolut_v2(tmp_path):
+    revolut_config = BankConfig.from_file(load_bank_config("revolut_v2.toml"))
+    converter = Converter(revolut_config)
+    header = load_test_example("revolut_v2.csv").read_text(encoding="utf-8")
+    statement = tmp_path / "statement.csv"
+    statement.write_text(
+        header.splitlines()[0] + "\n"
+        "CARD_PAYMENT,Current,2021-10-01 22:36:52,2021-10-03 16:33:13,"
+        "Shop,-1,234.50,12.35,SEK,COMPLETED,3768.16\n",
+        encoding="utf-8",
+    )
+
+    rows = list(converter.parseRows(converter.readInput(statement, [])))
+    assert [(outflow, inflow) for *_, outflow, inflow in rows] == [(124685, 0)]
+    assert converter.metrics.rows["rejoined"] == 1
+    assert len(converter.diagnostics) == 0
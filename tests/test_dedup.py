@@ -0,0 +1,96 @@
+from util import load_test_example, load_bank_config
+from src.batch import BatchJob, convert_many
+from src.config import BankConfig
+from src.converter import bank2ynab
+from src.sinks import MemorySink
+from src.dedup import DedupIndex
+
+import pytest
+
+TRANSACTION = ("2021/01/03", "shop", "", "30.00", "0.00")
+
+
+@pytest.fixture
+def index(tmp_path):
+    with DedupIndex(tmp_path / "dedup.sqlite3") as index:
+        yield index
+
+
+def test_occurrences(index):
+    index.new_statement()
+    assert index.is_new(*TRANSACTION)
+    assert index.is_new(*TRANSACTION)  # identical transactions in one statement
+
+    index.new_statement()
+    assert not index.is_new(*TRANSACTION)
+    assert not index.is_new(*TRANSACTION)
+    assert index.is_new(*TRANSACTION)  # a third one was not seen before
+    assert len(index) == 3
+
+
+def test_uncommitted_changes_are_discarded(tmp_path):
+    with DedupIndex(tmp_path / "dedup.sqlite3") as index:
+        index.new_statement()
+        index.is_new(*TRANSACTION)
+        index.commit()
+        index.new_statement()
+        index.is_new(*TRANSACTION[:-1], "1.00")
+
+    with DedupIndex(tmp_path / "dedup.sqlite3") as index:
+        assert len(index) == 1
+
+
+def test_bank2ynab_drops_duplicates(tmp_path, index):
+    csv_path = load_test_example("revolut_v2.csv")
+    revolut_config = BankConfig.from_file(load_bank_config("revolut_v2.toml"))
+    output_csv = tmp_path / "out.csv"
+
+    result = bank2ynab(revolut_config, csv_path, output_csv, [], dedup=index)
+    assert result == (True, 0, 0, 5, 5)
+
+    output_csv.unlink()
+    result = bank2ynab(revolut_config, csv_path, output_csv, [], dedup=index)
+    assert result == (False, 0, 0, 5, 0)
+    assert not output_csv.exists()
+
+
+def test_batch_drops_duplicates(tmp_path, index):
+    csv_path = load_test_example("revolut_v2.csv")
+    job = BatchJob(load_bank_config("revolut_v2.toml"), csv_path)
+
+    results = convert_many([job, job], tmp_path, merge="merged.csv", dedup=index)
+    assert [r.result for r in results] == [(True, 0, 0, 5, 5), (False, 0, 0, 5, 0)]
+
+    rows = (tmp_path / "merged.csv").read_text(encoding="utf-8").splitlines()
+    assert len(rows) == 1 + 5
+
+
+def test_batch_all_duplicates(tmp_path, index):
+    csv_path = load_test_example("revolut_v2.csv")
+    job = BatchJob(load_bank_config("revolut_v2.toml"), csv_path)
+
+    convert_many([job], tmp_path, dedup=index)
+    (result,) = convert_many([job], tmp_path, dedup=index)
+    assert result.result == (False, 0, 0, 5, 0)
+    assert not result.output_csv.exists()
+
+
+class FailingSink(MemorySink):
+    def write(self, rows):
+        raise OSError("the disk is full")
+
+
+def test_failed_conversion_is_not_indexed(tmp_path, index):
+    revolut_config = BankConfig.from_file(load_bank_config("revolut_v2.toml"))
+    revolut_csv = load_test_example("revolut_v2.csv")
+    other_csv = tmp_path / "other.csv"
+    header, *rows = revolut_csv.read_text(encoding="utf-8").splitlines()
+    other_csv.write_text("\n".join([header, rows[0]]) + "\n", encoding="utf-8")
+
+    with pytest.raises(OSError):
+        bank2ynab(revolut_config, revolut_csv, FailingSink(), [], dedup=index)
+    # the next successful conversion commits the index
+    assert bank2ynab(revolut_config, other_csv, MemorySink(), [], dedup=index)[0]
+
+    result = bank2ynab(revolut_config, revolut_csv, MemorySink(), [], dedup=index)
+    assert result == (True, 0, 0, 5, 4)
@@ -0,0 +1,139 @@
+import codecs
+import os
+from pathlib import Path
+
+from util import bank_configs_dir, load_test_example
+from src.batch import BatchJob, convert_many
+from src.converter import bank2ynab
+from src.detect import BankDetector, detect_bank
+
+import pytest
+
+
+@pytest.fixture
+def detector() -> BankDetector:
+    return BankDetector(bank_configs_dir())
+
+
+@pytest.mark.parametrize(
+    "example, bank",
+    [
+        ("ica_banken_v1.csv", "ICA Banken"),
+        ("nordea_v2.csv", "Nordea"),
+        ("revolut_v2.csv", "Revolut"),
+    ],
+)
+def test_examples(detector, example, bank):
+    detection = detector.detect(load_test_example(example))
+    assert detection.config.name == bank
+    assert detection.config_path.parent == bank_configs_dir()
+    assert detection.encoding == "utf-8"
+
+
+def test_no_match(detector):
+    assert detector.detect(load_test_example("example_ynab.csv")) is None
+
+
+def test_empty_statement(detector, tmp_path):
+    (statement := tmp_path / "empty.csv").write_bytes(b"")
+    assert detector.detect(statement) is None
+
+
+def test_encoding_and_bom(detector, tmp_path):
+    nordea = load_test_example("nordea_v2.csv").read_text(encoding="utf-8")
+
+    (cp1252 := tmp_path / "cp1252.csv").write_bytes(nordea.encode("cp1252"))
+    detection = detector.detect(cp1252)
+    assert (detection.config.name, detection.encoding) == ("Nordea", "cp1252")
+
+    (bom := tmp_path / "bom.csv").write_bytes(codecs.BOM_UTF8 + nordea.encode())
+    detection = detector.detect(bom)
+    assert (detection.config.name, detection.delimiter) == ("Nordea", ";")
+
+
+def test_carriage_returns(detector, tmp_path):
+    nordea = load_test_example("nordea_v2.csv").read_bytes()
+    (statement := tmp_path / "cr.csv").write_bytes(nordea.replace(b"\n", b"\r"))
+    assert detector.detect(statement).config.name == "Nordea"
+
+
+def test_detected_encoding_is_converted(tmp_path):
+    nordea = load_test_example("nordea_v2.csv").read_text(encoding="utf-8")
+    # only the rows have non-ASCII characters
+    nordea = nordea.replace("Bokföringsdag", "Bokforingsdag")
+    (cp1252 := tmp_path / "cp1252.csv").write_bytes(nordea.encode("cp1252"))
+    (banks := tmp_path / "banks").mkdir()
+    toml = (bank_configs_dir() / "nordea_v2.toml").read_text(encoding="utf-8")
+    (banks / "nordea.toml").write_text(
+        toml.replace("Bokföringsdag", "Bokforingsdag"), encoding="utf-8"
+    )
+
+    detection = detect_bank(cp1252, banks)
+    assert (detection.config.name, detection.encoding) == ("Nordea", "cp1252")
+    result = bank2ynab(
+        detection.config, cp1252, tmp_path / "out.csv", [], encoding="cp1252"
+    )
+    assert result == (True, 0, 0, 4, 4)
+    assert "Återköp" in (tmp_path / "out.csv").read_text(encoding="utf-8")
+
+    (out_dir := tmp_path / "out").mkdir()
+    job = BatchJob(detection.config_path, cp1252, encoding=detection.encoding)
+    (result,) = convert_many([job], out_dir, chunk_size=64)
+    assert result.result == (True, 0, 0, 4, 4)
+
+
+def write_config(path: Path, name: str, date_format: str, payee: str = "Payee"):
+    path.write_text(
+        f'name = "{name}"\n'
+        "[currency_format]\n"
+        "thousands_separator = ''\n"
+        "decimal_point = '.'\n"
+        "[csv]\n"
+        f"date_format = '{date_format}'\n"
+        "[ynab_mapping]\n"
+        "date = 'Date'\n"
+        "inflow = 'Amount'\n"
+        "outflow = 'Amount'\n"
+        f"payee = '{payee}'\n",
+        encoding="utf-8",
+    )
+
+
+def test_most_columns_win(tmp_path):
+    (banks := tmp_path / "banks").mkdir()
+    write_config(banks / "a.toml", "Unknown payee", "%Y-%m-%d", payee="Shop")
+    write_config(banks / "b.toml", "Known payee", "%Y-%m-%d")
+    (statement := tmp_path / "statement.csv").write_text(
+        "Date,Payee,Amount\n2021-01-01,Shop,-10.00\n", encoding="utf-8"
+    )
+
+    assert detect_bank(statement, banks).config.name == "Known payee"
+
+
+def test_date_format_breaks_ties(tmp_path):
+    (banks := tmp_path / "banks").mkdir()
+    write_config(banks / "a.toml", "ISO dates", "%Y-%m-%d")
+    write_config(banks / "b.toml", "US dates", "%m/%d/%Y")
+    (statement := tmp_path / "statement.csv").write_text(
+        "Date,Payee,Amount\n01/31/2021,Shop,-10.00\n", encoding="utf-8"
+    )
+
+    assert detect_bank(statement, banks).config.name == "US dates"
+
+
+def test_changed_configs_are_detected(tmp_path):
+    (banks := tmp_path / "banks").mkdir()
+    write_config(banks / "a.toml", "Old name", "%Y-%m-%d")
+    (statement := tmp_path / "statement.csv").write_text(
+        "Date,Payee,Amount\n2021-01-01,Shop,-10.00\n", encoding="utf-8"
+    )
+    assert detect_bank(statement, banks).config.name == "Old name"
+
+    write_config(banks / "a.toml", "New name", "%Y-%m-%d")
+    stat = (banks / "a.toml").stat()
+    os.utime(banks / "a.toml", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert detect_bank(statement, banks).config.name == "New name"
+
+    write_config(banks / "b.toml", "Added", "%Y-%m-%d", payee="Shop")
+    (banks / "a.toml").unlink()
+    assert detect_bank(statement, banks).config.name == "Added"
@@ -0,0 +1,76 @@
+import csv
+import warnings
+
+from util import load_template_config
+from src.config import BankConfig
+from src.converter import Converter, bank2ynab
+from src.diagnostics import BAD_FORMAT, EMPTY, OVERFLOW, Diagnostics
+
+import pytest
+
+HEADER = "Date,Payee,Category,Memo,Outflow,Inflow"
+
+
+@pytest.fixture
+def template_config() -> BankConfig:
+    return BankConfig.from_file(load_template_config())
+
+
+def test_samples_are_limited():
+    diagnostics = Diagnostics(max_samples=2)
+    for i in range(10):
+        diagnostics.report(BAD_FORMAT, {"date": f"{i}"}, line=i + 2, reason="bad")
+
+    assert len(diagnostics) == 10
+    assert diagnostics.samples[BAD_FORMAT] == [
+        "line 2: {'date': '0'} (bad)",
+        "line 3: {'date': '1'} (bad)",
+    ]
+
+    with pytest.warns(RuntimeWarning, match="10 incorrectly formatted row"):
+        diagnostics.close()
+
+
+def test_no_issues_no_warning():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        Diagnostics().close()
+
+
+def test_one_warning_per_conversion(tmp_path, template_config):
+    statement = tmp_path / "statement.csv"
+    rows = ["2021-01-01,Shop,,,10.00,", ",,,,,", "2021-01-02,Shop,,,10.00,,extra"]
+    rows += ["not a date,Shop,,,10.00,"] * 100
+    statement.write_text("\n".join([HEADER, *rows]) + "\n", encoding="utf-8")
+
+    converter = Converter(template_config)
+    with pytest.warns(RuntimeWarning) as record:
+        assert converter.convert(statement, [], tmp_path / "out.csv")
+
+    assert len(record) == 1
+    assert converter.diagnostics.counts == {EMPTY: 1, OVERFLOW: 1, BAD_FORMAT: 100}
+    assert converter.numParsedRows == 2
+
+
+def test_rejects_csv(tmp_path, template_config):
+    statement = tmp_path / "statement.csv"
+    rows = ["2021-01-01,Shop,,,10.00,", "not a date,Shop,,,10.00,"]
+    rows += ["2021-01-02,Shop,,,10.00,,extra"]  # converted, so not a reject
+    statement.write_text("\n".join([HEADER, *rows]) + "\n", encoding="utf-8")
+    rejects_csv = tmp_path / "rejects.csv"
+
+    with pytest.warns(RuntimeWarning, match="1 excess columns"):
+        assert bank2ynab(
+            template_config,
+            statement,
+            tmp_path / "out.csv",
+            [],
+            rejects_csv=rejects_csv,
+        ) == (True, 0, 0, 3, 2)
+
+    with rejects_csv.open(encoding="utf-8", newline="") as f:
+        header, *rejects = list(csv.reader(f))
+    assert header == ["category", "line", "reason", "row"]
+    assert len(rejects) == 1
+    assert rejects[0][0] == BAD_FORMAT
+    assert rejects[0][3:] == ["not a date", "Shop", "", "", "10.00", ""]
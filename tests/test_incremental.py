@@ -0,0 +1,130 @@
+from pathlib import Path
+import sys
+
+from util import load_bank_config, load_template_config
+from src.batch import BatchJob, convert_many, main
+from src.config import BankConfig
+from src.converter import bank2ynab
+from src.incremental import Watermark, WatermarkStore
+
+import pytest
+import tomli
+
+HEADER = "Date,Payee,Category,Memo,Outflow,Inflow"
+TRANSACTIONS = [
+    "2021-01-01,Shop,,,10.00,",
+    "2021-01-02,Shop,,,20.00,",
+    "2021-01-03,Shop,,,30.00,",
+    "2021-01-03,Shop,,,30.00,",  # an identical transaction on the same day
+    "2021-01-04,Employer,,,,1000.00",
+]
+
+
+def write_statement(path: Path, rows: list[str]) -> Path:
+    path.write_text("\n".join([HEADER, *rows]) + "\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def template_config() -> BankConfig:
+    return BankConfig.from_file(load_template_config())
+
+
+def test_second_run_skips_everything(tmp_path, template_config):
+    statement = write_statement(tmp_path / "s.csv", TRANSACTIONS)
+    watermarks = WatermarkStore(tmp_path / "state.json")
+    output_csv = tmp_path / "out.csv"
+
+    result = bank2ynab(template_config, statement, output_csv, [], watermarks)
+    assert result == (True, 0, 0, 5, 5)
+    assert watermarks.get(template_config.name).date == "2021/01/04"
+
+    result = bank2ynab(
+        template_config, statement, output_csv, [], WatermarkStore(watermarks.path)
+    )
+    assert result == (False, 0, 0, 5, 0)
+
+
+def test_overlapping_statements(tmp_path, template_config):
+    first = write_statement(tmp_path / "first.csv", TRANSACTIONS[:3])
+    second = write_statement(tmp_path / "second.csv", TRANSACTIONS[1:])
+    watermarks = WatermarkStore(tmp_path / "state.json")
+    output_csv = tmp_path / "out.csv"
+
+    bank2ynab(template_config, first, output_csv, [], watermarks, account="acc")
+    assert watermarks.get(template_config.name, "acc").date == "2021/01/03"
+    assert watermarks.get(template_config.name, "other") == Watermark()
+
+    # The second identical transaction on 2021-01-03 is new
+    result = bank2ynab(template_config, second, output_csv, [], watermarks, "acc")
+    assert result == (True, 0, 0, 4, 2)
+    rows = output_csv.read_text(encoding="utf-8").splitlines()[1:]
+    assert rows == [
+        "2021/01/03,Shop,,,30.00,0.00",
+        "2021/01/04,Employer,,,0.00,1000.00",
+    ]
+
+
+def test_newest_first_stops_reading(tmp_path):
+    with load_template_config().open("rb") as f:
+        config_dict = tomli.load(f)
+    config_dict["csv"]["date_order"] = "descending"
+    config = BankConfig.from_dict(config_dict)
+
+    watermarks = WatermarkStore(tmp_path / "state.json")
+    watermarks.set(config.name, "", Watermark("2021/01/02", {}))
+    older = ["2020-12-31,Shop,,,1.00,", "not a date,,,,,"]
+    statement = write_statement(tmp_path / "s.csv", TRANSACTIONS[::-1] + older)
+
+    # Reading stops at the first row before the watermark
+    result = bank2ynab(config, statement, tmp_path / "out.csv", [], watermarks)
+    assert result == (True, 0, 0, 5, 4)
+
+
+def test_batch_watermarks(tmp_path):
+    toml_path = load_bank_config("revolut_v2.toml")
+    statement = Path(__file__).parent / "example_csv" / "revolut_v2.csv"
+    jobs = [BatchJob(toml_path, statement, "a"), BatchJob(toml_path, statement, "b")]
+    watermarks = WatermarkStore(tmp_path / "state.json")
+
+    results = convert_many(jobs, tmp_path, watermarks=watermarks)
+    assert all(r.result == (True, 0, 0, 5, 5) for r in results)
+
+    results = convert_many(jobs, tmp_path, watermarks=WatermarkStore(watermarks.path))
+    assert all(r.result == (False, 0, 0, 5, 0) for r in results)
+
+    with pytest.raises(ValueError):
+        convert_many(jobs, tmp_path, watermarks=watermarks, chunk_size=1)
+
+
+def test_batch_rerun_with_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    statement = Path(__file__).parent / "example_csv" / "nordea_v2.csv"
+    (out_dir := tmp_path / "out").mkdir()
+    argv = ["batch", "-b", "nordea_v2", str(statement), "-o", str(out_dir)]
+    argv += ["--state", str(tmp_path / "state.json")]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    with pytest.raises(SystemExit) as exit:
+        main()
+    assert exit.value.code == 0
+    assert (out_dir / "nordea_v2_ynab.csv").exists()
+
+    # no new transactions is a success, and the earlier output is removed
+    with pytest.raises(SystemExit) as exit:
+        main()
+    assert exit.value.code == 0
+    assert list(out_dir.iterdir()) == []
+
+
+def test_batch_overlapping_statements(tmp_path):
+    first = write_statement(tmp_path / "a.csv", TRANSACTIONS[:2])
+    second = write_statement(tmp_path / "b.csv", TRANSACTIONS[1:3])
+    jobs = [BatchJob(load_template_config(), s, "acc") for s in (first, second)]
+    (out_dir := tmp_path / "out").mkdir()
+    watermarks = WatermarkStore(tmp_path / "state.json")
+
+    results = convert_many(jobs, out_dir, merge="merged.csv", watermarks=watermarks)
+    assert [r.result for r in results] == [(True, 0, 0, 2, 2), (True, 0, 0, 2, 1)]
+    rows = (out_dir / "merged.csv").read_text(encoding="utf-8").splitlines()[1:]
+    assert [row[:10] for row in rows] == ["2021/01/01", "2021/01/02", "2021/01/03"]
@@ -0,0 +1,97 @@
+from pathlib import Path
+import json
+
+from util import load_template_config
+from src.batch import BatchJob, convert_many
+from src.config import BankConfig
+from src.converter import Converter, bank2ynab
+from src.metrics import STAGES, ConversionMetrics
+
+import pytest
+
+HEADER = "Date,Payee,Category,Memo,Outflow,Inflow"
+ROWS = [
+    "2021-01-01,Shop,,,10.00,",
+    ",,,,,",
+    "2021-01-02,PayPal,,,20.00,",
+    "2021-13-03,Shop,,,30.00,",  # no 13th month
+    "2021-01-04,Employer,,,,1000.00",
+]
+
+
+@pytest.fixture
+def statement(tmp_path) -> Path:
+    path = tmp_path / "statement.csv"
+    path.write_text("\n".join([HEADER, *ROWS]) + "\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def template_config() -> BankConfig:
+    return BankConfig.from_file(load_template_config())
+
+
+def test_counters(tmp_path, statement, template_config):
+    converter = Converter(template_config)
+    with pytest.warns(RuntimeWarning):
+        converter.convert(statement, ["paypal"], tmp_path / "out.csv")
+
+    metrics = converter.metrics
+    assert metrics.rows == {"empty": 1, "ignored": 1, "read": 3, "parsed": 2}
+    assert metrics.errors == {"ValueError": 1}
+    assert metrics.bytes_read == statement.stat().st_size
+    assert list(metrics.seconds) == list(STAGES)
+    assert all(seconds >= 0 for seconds in metrics.seconds.values())
+    assert metrics.seconds["read"] > 0 and metrics.seconds["write"] > 0
+    assert metrics.seconds["tokenize"] > 0
+
+
+def test_bank2ynab_writes_metrics(tmp_path, statement, template_config):
+    metrics_file = tmp_path / "metrics.json"
+    with pytest.warns(RuntimeWarning):
+        bank2ynab(
+            template_config,
+            statement,
+            tmp_path / "out.csv",
+            [],
+            metrics_file=metrics_file,
+        )
+
+    metrics = json.loads(metrics_file.read_text(encoding="utf-8"))
+    assert metrics["rows"]["parsed"] == 3
+    assert set(metrics["seconds"]) == set(STAGES)
+
+
+def test_to_prometheus():
+    metrics = ConversionMetrics(bytes_read=10)
+    metrics.rows["read"] = 3
+    metrics.errors["ValueError"] = 1
+
+    lines = metrics.to_prometheus().splitlines()
+    assert "# TYPE bank2ynab_stage_seconds gauge" in lines
+    assert 'bank2ynab_stage_seconds{stage="write"} 0.0' in lines
+    assert 'bank2ynab_rows{outcome="read"} 3' in lines
+    assert "bank2ynab_bytes_read 10" in lines
+    assert 'bank2ynab_errors{type="ValueError"} 1' in lines
+
+
+def test_merge():
+    a, b = ConversionMetrics(bytes_read=1), ConversionMetrics(bytes_read=2)
+    a.rows["read"], b.rows["read"] = 1, 2
+    a.seconds["read"], b.seconds["read"] = 0.5, 0.25
+
+    merged = a.merge(b)
+    assert merged.bytes_read == 3
+    assert merged.rows["read"] == 3
+    assert merged.seconds["read"] == 0.75
+    assert merged.total_seconds == 0.75
+
+
+def test_batch_metrics(tmp_path, statement):
+    jobs = [BatchJob(load_template_config(), statement)] * 2
+    (out_dir := tmp_path / "out").mkdir()
+    results = convert_many(jobs, out_dir, max_workers=2, toIgnore=["paypal"])
+
+    merged = results[0].metrics.merge(results[1].metrics)
+    assert merged.rows["parsed"] == 4
+    assert merged.errors["ValueError"] == 2
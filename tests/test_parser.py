@@ -0,0 +1,139 @@
+from datetime import datetime
+import re
+from decimal import Decimal, localcontext
+
+from hypothesis import given, settings
+from hypothesis.strategies import dates, sampled_from, text, times
+import pytest
+
+from src.config import CurrencyFormat
+from src.converter import DateParser, TransactionValueParser, minor_units_to_str
+
+CURRENCY_FORMATS = [
+    CurrencyFormat(thousands_sep="", decimal_point="."),
+    CurrencyFormat(thousands_sep="", decimal_point=","),
+    CurrencyFormat(thousands_sep=" ", decimal_point=","),
+    CurrencyFormat(thousands_sep=",", decimal_point="."),
+    CurrencyFormat(thousands_sep=".", decimal_point=","),
+    CurrencyFormat(thousands_sep=",", decimal_point=".", decimals=3),
+]
+
+
+def regex_parse(config: CurrencyFormat, value: str) -> int | None:
+    """The original three-pass parser, kept as the reference behaviour"""
+    thousands_match = re.compile(re.escape(config.thousands_sep))
+    n = config.decimals
+    fractional_match = re.compile(
+        rf"{re.escape(config.decimal_point)}(?P<decimals>[0-9]{{1,{n}}}(?![0-9]))"
+    )
+    decimal_match = re.compile(rf"-?[0-9]+(\.[0-9]{{1,{n}}})?")
+
+    no_thousands_groups = re.sub(thousands_match, "", value)
+    replaced_decimal = re.sub(fractional_match, r".\g<decimals>", no_thousands_groups)
+    number_only = re.search(decimal_match, replaced_decimal)
+    if number_only is None:
+        return None
+
+    with localcontext(prec=1000):  # scale exactly
+        return int(Decimal(number_only[0]).scaleb(config.decimals))
+
+
+@pytest.mark.parametrize(
+    "config, value, expect",
+    [
+        (CURRENCY_FORMATS[0], "-405.63", -40563),
+        (CURRENCY_FORMATS[0], "1000", 100000),
+        (CURRENCY_FORMATS[0], "3.4", 340),
+        (CURRENCY_FORMATS[0], "", None),
+        (CURRENCY_FORMATS[1], "-42,94", -4294),
+        (CURRENCY_FORMATS[1], "1,234", 100),
+        (CURRENCY_FORMATS[2], "2 500,00 kr", 250000),
+        (CURRENCY_FORMATS[3], "1,415.41", 141541),
+        (CURRENCY_FORMATS[4], "-1.000,5", -100050),
+        (CURRENCY_FORMATS[5], "1,000.125", 1000125),
+    ],
+)
+def test_parse(config, value, expect):
+    assert TransactionValueParser(config).parse(value) == expect
+
+
+@settings(max_examples=10**3)
+@given(
+    config=sampled_from(CURRENCY_FORMATS),
+    value=text(alphabet="0123456789-., k"),
+)
+def test_parse_matches_regex_parser(config, value):
+    assert TransactionValueParser(config).parse(value) == regex_parse(config, value)
+
+
+@pytest.mark.parametrize(
+    "units, decimals, expect",
+    [
+        (0, 2, "0.00"),
+        (340, 2, "3.40"),
+        (-5, 2, "-0.05"),
+        (100000, 2, "1000.00"),
+        (1000125, 3, "1000.125"),
+        (42, 0, "42"),
+    ],
+)
+def test_minor_units_to_str(units, decimals, expect):
+    assert minor_units_to_str(units, decimals) == expect
+
+
+def strptime_parse(date_format: str, value: str) -> str | None:
+    try:
+        return datetime.strptime(value, date_format).strftime("%Y/%m/%d")
+    except ValueError:
+        return None
+
+
+def date_parse(date_format: str, value: str) -> str | None:
+    try:
+        return DateParser(date_format).parse(value)
+    except ValueError:
+        return None
+
+
+@pytest.mark.parametrize(
+    "date_format, value, expect",
+    [
+        ("%Y-%m-%d", "2021-04-24", "2021/04/24"),
+        ("%Y-%m-%d", "2021-4-2", "2021/04/02"),
+        ("%Y-%m-%d %H:%M:%S", "2022-05-06 9:32:08", "2022/05/06"),
+        ("%d/%m/%Y", "24/04/2021", "2021/04/24"),
+        ("%Y-%m-%d", "2021-02-29", None),
+        ("%Y-%m-%d %H:%M:%S", "2022-05-06 24:00:00", None),
+        ("%Y-%m-%d", "", None),
+    ],
+)
+def test_parse_date(date_format, value, expect):
+    assert date_parse(date_format, value) == expect
+
+
+@settings(max_examples=10**3)
+@given(
+    date_format=sampled_from(["%Y-%m-%d", "%Y-%m-%d %H:%M:%S"]),
+    value=text(alphabet="0123456789-: ", max_size=20),
+)
+def test_parse_date_matches_strptime(date_format, value):
+    assert date_parse(date_format, value) == strptime_parse(date_format, value)
+
+
+@given(
+    date=dates(),
+    time=times(),
+    date_format=sampled_from(["%Y-%m-%d", "%Y-%m-%d %H:%M:%S"]),
+)
+def test_parse_formatted_date_matches_strptime(date, time, date_format):
+    value = datetime.combine(date, time).strftime(date_format)
+    assert date_parse(date_format, value) == strptime_parse(date_format, value)
+
+
+def test_parse_date_is_cached():
+    parser = DateParser("%Y-%m-%d", cache_size=2)
+    for value in ["2021-04-24", "2021-04-24", "2021-04-25"]:
+        parser.parse(value)
+
+    info = parser.parse.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
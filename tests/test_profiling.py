@@ -0,0 +1,41 @@
+from util import load_bank_config, load_test_example
+from src.batch import BatchJob, convert_many
+from src.config import BankConfig
+from src.converter import bank2ynab
+from src.profiling import profile, summary_file
+
+import pstats
+import pytest
+
+
+def test_bank2ynab_profile(tmp_path):
+    bank = BankConfig.from_file(load_bank_config("revolut_v2.toml"))
+    output_csv = tmp_path / "out.csv"
+    bank2ynab(
+        bank, load_test_example("revolut_v2.csv"), output_csv, [], profile="cprofile"
+    )
+
+    prof_file = tmp_path / "out.prof"
+    functions = {f for _, _, f in pstats.Stats(str(prof_file)).stats}
+    assert "parseRow" in functions
+
+    summary = summary_file(prof_file).read_text(encoding="utf-8")
+    assert summary.startswith("Hot spots of the conversion:")
+    assert "converter.py" in summary and "writerow" in summary
+
+
+def test_unknown_profiler(tmp_path):
+    with pytest.raises(ValueError):
+        with profile(tmp_path / "out.prof", profiler="perf"):
+            pass
+
+
+def test_batch_profile(tmp_path):
+    job = BatchJob(
+        load_bank_config("revolut_v2.toml"), load_test_example("revolut_v2.csv")
+    )
+    results = convert_many([job], tmp_path, toIgnore=[], profiler="cprofile")
+
+    assert results[0].converted
+    assert (tmp_path / "revolut_v2_ynab.prof").is_file()
+    assert summary_file(tmp_path / "revolut_v2_ynab.prof").is_file()
@@ -0,0 +1,98 @@
+import codecs
+
+from util import load_template_config
+from src.config import BankConfig
+from src.converter import Converter
+from src.reader import MappedStatement
+
+STATEMENT = 'Date,Payee\r\n2021-01-01,"Shop\r\nå"\r\n2021-01-02,Café'
+
+
+def test_lines(tmp_path):
+    statement_csv = tmp_path / "statement.csv"
+    statement_csv.write_bytes(STATEMENT.encode("utf-8"))
+
+    with MappedStatement(statement_csv) as statement:
+        assert statement.start == 0
+        lines = list(statement.lines())
+        assert statement.offset == len(statement)
+
+    assert lines == [
+        "Date,Payee\r\n",
+        '2021-01-01,"Shop\r\n',
+        'å"\r\n',
+        "2021-01-02,Café",
+    ]
+
+
+def test_bom_is_skipped(tmp_path):
+    statement_csv = tmp_path / "statement.csv"
+    statement_csv.write_bytes(codecs.BOM_UTF8 + STATEMENT.encode("utf-8"))
+
+    with MappedStatement(statement_csv) as statement:
+        assert statement.start == len(codecs.BOM_UTF8)
+        assert next(statement.lines()) == "Date,Payee\r\n"
+
+
+def test_byte_range(tmp_path):
+    statement_csv = tmp_path / "statement.csv"
+    statement_csv.write_bytes(STATEMENT.encode("utf-8"))
+    start = STATEMENT.encode("utf-8").index(b"2021-01-02")  # 'å' is two bytes
+
+    with MappedStatement(statement_csv) as statement:
+        assert list(statement.lines(0, start)) == [
+            "Date,Payee\r\n",
+            '2021-01-01,"Shop\r\n',
+            'å"\r\n',
+        ]
+        assert list(statement.lines(start)) == ["2021-01-02,Café"]
+
+
+def test_carriage_returns(tmp_path):
+    statement_csv = tmp_path / "statement.csv"
+    statement_csv.write_bytes(STATEMENT.replace("\r\n", "\r").encode("utf-8"))
+
+    with MappedStatement(statement_csv) as statement:
+        assert statement.newline == b"\r"
+        assert list(statement.lines()) == [
+            "Date,Payee\r",
+            '2021-01-01,"Shop\r',
+            'å"\r',
+            "2021-01-02,Café",
+        ]
+
+    statement_csv.write_bytes(
+        b"Date,Payee,Category,Memo,Outflow,Inflow\r"
+        b'2021-01-01,"Shop\rB",,,10.00,\r'
+        b"2021-01-02,Shop,,,20.00,\r"
+    )
+    converter = Converter(BankConfig.from_file(load_template_config()))
+    rows = list(converter.parseRows(converter.readInput(statement_csv, [])))
+    assert rows == [
+        ("2021/01/01", "Shop\rB", "", "", 1000, 0),
+        ("2021/01/02", "Shop", "", "", 2000, 0),
+    ]
+
+
+def test_empty_file(tmp_path):
+    statement_csv = tmp_path / "statement.csv"
+    statement_csv.write_bytes(b"")
+
+    with MappedStatement(statement_csv) as statement:
+        assert list(statement.lines()) == []
+
+    converter = Converter(BankConfig.from_file(load_template_config()))
+    assert not converter.convert(statement_csv, [], tmp_path / "out.csv")
+
+
+def test_converter_reads_bom(tmp_path):
+    statement_csv = tmp_path / "statement.csv"
+    statement_csv.write_bytes(
+        codecs.BOM_UTF8 + b"Date,Payee,Category,Memo,Outflow,Inflow\n"
+        b"2021-01-01,Shop,,,10.00,\n"
+    )
+
+    converter = Converter(BankConfig.from_file(load_template_config()))
+    rows = list(converter.parseRows(converter.readInput(statement_csv, [])))
+    assert rows == [("2021/01/01", "Shop", "", "", 1000, 0)]
+    assert converter.metrics.bytes_read == statement_csv.stat().st_size
@@ -0,0 +1,150 @@
+import os
+from pathlib import Path
+
+from util import bank_configs_dir, load_template_config
+from src.config import BankConfig
+from src.converter import Converter, normalize
+from src.registry import ConfigRegistry, bank_index
+
+import pytest
+
+
+def write_bank(path: Path, name: str):
+    path.write_text(f'name = "{name}"\n', encoding="utf-8")
+
+
+@pytest.fixture
+def bank_dir(tmp_path) -> Path:
+    (banks := tmp_path / "banks").mkdir()
+    write_bank(banks / "b.toml", "Bank B")
+    write_bank(banks / "a.toml", "Bank A")
+    (banks / "notes.txt").write_text("not a config", encoding="utf-8")
+    return banks
+
+
+@pytest.fixture
+def cache_dir(tmp_path) -> Path:
+    return tmp_path / "cache"
+
+
+def test_names_sorted(bank_dir, cache_dir):
+    banks = bank_index(bank_dir, cache_dir)
+    assert [bank.name for bank in banks] == ["Bank A", "Bank B"]
+    assert [bank.path for bank in banks] == [bank_dir / "a.toml", bank_dir / "b.toml"]
+
+
+def test_index_reused(bank_dir, cache_dir):
+    bank_index(bank_dir, cache_dir)
+    (index_file,) = cache_dir.iterdir()
+    written = index_file.stat().st_mtime_ns
+
+    assert [bank.name for bank in bank_index(bank_dir, cache_dir)] == [
+        "Bank A",
+        "Bank B",
+    ]
+    assert index_file.stat().st_mtime_ns == written
+
+
+def test_changed_file(bank_dir, cache_dir):
+    bank_index(bank_dir, cache_dir)
+    write_bank(bank_dir / "a.toml", "Bank C, formerly A")
+    stat = (bank_dir / "a.toml").stat()
+    os.utime(bank_dir / "a.toml", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    banks = bank_index(bank_dir, cache_dir)
+    assert [bank.name for bank in banks] == ["Bank B", "Bank C, formerly A"]
+
+
+def test_added_and_removed_files(bank_dir, cache_dir):
+    bank_index(bank_dir, cache_dir)
+    (bank_dir / "b.toml").unlink()
+    write_bank(bank_dir / "c.toml", "Bank C")
+    stat = bank_dir.stat()
+    os.utime(bank_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    banks = bank_index(bank_dir, cache_dir)
+    assert [bank.name for bank in banks] == ["Bank A", "Bank C"]
+
+
+def test_unnamed_and_invalid_skipped(bank_dir, cache_dir):
+    (bank_dir / "unnamed.toml").write_text("[header]\n", encoding="utf-8")
+    (bank_dir / "broken.toml").write_text("name = ", encoding="utf-8")
+
+    banks = bank_index(bank_dir, cache_dir)
+    assert [bank.name for bank in banks] == ["Bank A", "Bank B"]
+
+
+def test_unwritable_cache(bank_dir, tmp_path):
+    (not_a_dir := tmp_path / "cache").write_text("", encoding="utf-8")
+    assert len(bank_index(bank_dir, not_a_dir)) == 2
+
+
+def test_bundled_banks(tmp_path):
+    for bank in bank_index(bank_configs_dir(), tmp_path):
+        assert BankConfig.from_file(bank.path).name == bank.name
+
+
+@pytest.fixture
+def config_file(tmp_path) -> Path:
+    (banks := tmp_path / "configs").mkdir()
+    path = banks / "template.toml"
+    path.write_bytes(load_template_config().read_bytes())
+    return path
+
+
+def test_config_kept_in_memory(config_file, cache_dir):
+    registry = ConfigRegistry(cache_dir)
+    config = registry.load(config_file)
+    assert config.name == BankConfig.from_file(config_file).name
+    assert registry.load(config_file) is config
+
+
+def test_converter_leaves_config_alone(config_file, cache_dir):
+    config = ConfigRegistry(cache_dir).load(config_file)
+    normalizer = config.normalizer
+    date_key = Converter(config).plan.date_key
+    assert config.normalizer is normalizer
+    assert date_key == normalize(config.date_column)
+
+
+def test_config_cached_on_disk(config_file, cache_dir, monkeypatch):
+    name = ConfigRegistry(cache_dir).load(config_file).name
+
+    def from_file(toml_config):
+        raise AssertionError(f"{toml_config} was parsed again")
+
+    monkeypatch.setattr(BankConfig, "from_file", from_file)
+    assert ConfigRegistry(cache_dir).load(config_file).name == name
+
+
+def test_changed_config_reloaded(config_file, cache_dir):
+    registry = ConfigRegistry(cache_dir)
+    registry.load(config_file)
+
+    toml = config_file.read_text(encoding="utf-8")
+    config_file.write_text(toml.replace('name = "', 'name = "New '), encoding="utf-8")
+    stat = config_file.stat()
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert registry.load(config_file).name.startswith("New ")
+    assert ConfigRegistry(cache_dir).load(config_file).name.startswith("New ")
+
+
+def test_corrupt_config_cache(config_file, cache_dir):
+    ConfigRegistry(cache_dir).load(config_file)
+    for path in cache_dir.glob("*.pickle"):
+        path.write_bytes(b"not a pickle")
+
+    assert ConfigRegistry(cache_dir).load(config_file).name
+
+
+def test_fixed_config_is_listed(bank_dir, cache_dir):
+    (bank_dir / "broken.toml").write_text("name = ", encoding="utf-8")
+    bank_index(bank_dir, cache_dir)
+
+    write_bank(bank_dir / "broken.toml", "Bank C")
+    stat = (bank_dir / "broken.toml").stat()
+    os.utime(bank_dir / "broken.toml", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    banks = bank_index(bank_dir, cache_dir)
+    assert [bank.name for bank in banks] == ["Bank A", "Bank B", "Bank C"]
@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import gzip
+import io
+import sys
+
+from util import load_test_example, load_bank_config
+from src.config import BankConfig
+from src.converter import Converter, bank2ynab
+from src.sinks import (
+    CsvFileSink,
+    GzipCsvSink,
+    MemorySink,
+    Sink,
+    StdoutSink,
+    as_sink,
+)
+
+import pytest
+
+
+@pytest.fixture
+def revolut_config() -> BankConfig:
+    return BankConfig.from_file(load_bank_config("revolut_v2.toml"))
+
+
+@pytest.fixture
+def revolut_csv():
+    return load_test_example("revolut_v2.csv")
+
+
+def test_memory_sink(revolut_config, revolut_csv):
+    sink = MemorySink()
+    assert bank2ynab(revolut_config, revolut_csv, sink, []) == (True, 0, 0, 5, 5)
+
+    assert sink.header == ("Date", "Payee", "Category", "Memo", "Outflow", "Inflow")
+    assert len(sink.rows) == 5
+    rows = list(csv.reader(io.StringIO(sink.to_csv())))
+    assert rows[0] == list(sink.header) and len(rows) == 6
+
+
+def test_gzip_sink(tmp_path, revolut_config, revolut_csv):
+    plain, compressed = tmp_path / "out.csv", tmp_path / "out.csv.gz"
+    bank2ynab(revolut_config, revolut_csv, plain, [])
+    bank2ynab(revolut_config, revolut_csv, GzipCsvSink(compressed), [])
+
+    with gzip.open(compressed, "rt", encoding="utf-8", newline="") as f:
+        assert f.read() == plain.read_bytes().decode("utf-8")
+    assert sorted(tmp_path.iterdir()) == [plain, compressed]
+
+
+def test_stdout_sink(tmp_path, monkeypatch, capsys, revolut_config, revolut_csv):
+    monkeypatch.chdir(tmp_path)  # no accignore.txt, which is reported
+    bank2ynab(revolut_config, revolut_csv, StdoutSink())
+
+    captured = capsys.readouterr()
+    rows = list(csv.reader(io.StringIO(captured.out)))
+    assert rows[0][0] == "Date" and len(rows) == 6
+    assert "Parsing all transactions..." in captured.err
+
+
+def test_stdout_sink_leaves_sys_stdout(revolut_config, revolut_csv):
+    stdout, stream = sys.stdout, io.StringIO()
+
+    def check_stdout(lines):
+        for line in lines:
+            assert sys.stdout is stdout
+            yield line
+
+    converter = Converter(revolut_config, line_filter=check_stdout)
+    assert converter.convert(revolut_csv, [], StdoutSink(stream))
+    assert len(stream.getvalue().splitlines()) == 6
+
+
+def test_sink_is_abstract():
+    class NoWrite(Sink):
+        def open(self, header):
+            pass
+
+    with pytest.raises(TypeError):
+        NoWrite()
+
+
+def test_as_sink(tmp_path):
+    sink = MemorySink()
+    assert as_sink(sink) is sink
+    assert type(as_sink(tmp_path / "out.csv")) is CsvFileSink
+    assert type(as_sink(tmp_path / "out.csv.gz")) is GzipCsvSink
+
+
+def test_failed_conversion_is_aborted(revolut_config):
+    sink = MemorySink()
+    sink.rows = [("an", "earlier", "conversion")]
+
+    def rows():
+        yield ("2021/01/01", "Shop", None, None, 1000, 0)
+        raise OSError("the statement went away")
+
+    with pytest.raises(OSError):
+        Converter(revolut_config).writeOutput(rows(), sink)
+    assert sink.rows == [("an", "earlier", "conversion")]
+
+
+def test_concurrent_conversions(revolut_config, revolut_csv):
+    def convert(_) -> MemorySink:
+        sink = MemorySink()
+        Converter(revolut_config).convert(revolut_csv, [], sink)
+        return sink
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        sinks = list(executor.map(convert, range(8)))
+    assert all(sink.rows == sinks[0].rows and len(sink.rows) == 5 for sink in sinks)